@@ -1,4 +1,6 @@
 import re
+import io
+import asyncio
 import datetime
 import asyncpg
 import statistics
@@ -9,18 +11,26 @@ from discord.ext import commands
 from discord.utils import get
 from discord import Intents
 from discord import File
-from matching import find_closest_match_and_score, rank_matches
+from matching import SearchIndex, merge_rankings
+from movie_catalogue import MovieCatalogue
+from member_directory import MemberDirectory
 from config import bot_token, PSQL_CREDENTIALS
 from scraping.ebert import ebert_lookup
-import plotting
+from plot_executor import PlotExecutor, PlotQueueFull
+from plot_cache import PlotCache
 from bot_narrate import NarrationCog
-from bot_helpers import fetch_as_dict, get_user_id, get_guild_id
+from bot_helpers import fetch_as_dict, get_guild_id, ensure_user_and_guild, ensure_ids
 from make_melonbot_db import make_db
 from db_mixin import DbMixin
+from chunking import iter_chunks, DISCORD_CHUNK_LENGTH
 
 COMMAND_PREFIX = "!"
+REVIEW_CANDIDATES = 100  # how many reviews the db hands to reviews() for fuzzy scoring
 
-make_db() # update db tables. creates & closes its own conn
+movie_catalogue = MovieCatalogue() # in-memory movies table per guild. anything that writes to movies must update it
+plot_executor = PlotExecutor() # plotting.py runs in worker processes so matplotlib can't block the event loop
+plot_cache = PlotCache() # rendered pngs. anything that writes to movies/ratings/reviews must bump it
+member_directory = MemberDirectory() # member id <-> name per guild, kept current by the on_member_* events at the bottom
 
 class Core(DbMixin, commands.Cog):
     def __init__(self, bot):
@@ -30,8 +40,7 @@ class Core(DbMixin, commands.Cog):
     async def add(self, ctx, *movie_title):
         """<movie title> — Add a movienight suggestion."""
         movie_title = " ".join(movie_title)
-        user_id = await get_user_id(ctx, self.db)
-        guild_id = await get_guild_id(ctx, self.db)
+        user_id, guild_id = await ensure_user_and_guild(ctx, self.db)
         existing_movie = await find_exact_movie(self.db, guild_id, movie_title)
         if existing_movie:
             if existing_movie['watched'] == 1:
@@ -41,13 +50,15 @@ class Core(DbMixin, commands.Cog):
             else:
                 return await ctx.send("a terrible thing has happened here.") # watched was neither 0 nor 1
         try:
-            await self.db.execute(
-                "INSERT INTO movies (guild_id, title, user_id, watched) VALUES ($1,$2,$3,$4)",
+            row = await self.db.fetchrow(
+                "INSERT INTO movies (guild_id, title, user_id, watched) VALUES ($1,$2,$3,$4) RETURNING *",
                 guild_id, movie_title, user_id, 0,
             )
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
+        movie_catalogue.put(guild_id, row)
+        plot_cache.bump(guild_id)
         return await send_goodly(ctx, f"'{movie_title}' has been added.")
                 
     @commands.command()
@@ -70,6 +81,8 @@ class Core(DbMixin, commands.Cog):
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
+        movie_catalogue.discard(guild_id, existing_movie['id'])
+        plot_cache.bump(guild_id)
         return await send_goodly(ctx, f"'{existing_movie['title']}' has been deleted.")
         
     async def _endorse_suggestion(self, ctx, guild_id, movie_title, endorser_user_id):
@@ -125,16 +138,14 @@ class Core(DbMixin, commands.Cog):
     async def endorse(self, ctx, *movie_title):
         """<movie title> — Endorse a suggestion."""
         movie_title = " ".join(movie_title)
-        user_id = await get_user_id(ctx, self.db)
-        guild_id = await get_guild_id(ctx, self.db)
+        user_id, guild_id = await ensure_user_and_guild(ctx, self.db)
         return await self._endorse_suggestion(ctx, guild_id, movie_title, user_id)
         
     @commands.command()
     async def unendorse(self, ctx, *movie_title):
         """<movie title> Remove endorsement."""
         movie_title = " ".join(movie_title)
-        user_id = await get_user_id(ctx, self.db)
-        guild_id = await get_guild_id(ctx, self.db)
+        user_id, guild_id = await ensure_user_and_guild(ctx, self.db)
         existing_movie = await find_exact_movie(self.db, guild_id, movie_title)
         if not existing_movie:
             return await ctx.send(f"'{movie_title}' doesn't exist.")
@@ -155,8 +166,7 @@ class Core(DbMixin, commands.Cog):
     @commands.command()
     async def rate(self, ctx, *movie_title_and_rating):
         """<movie title> <1-10> — Rate a movie."""
-        user_id = await get_user_id(ctx, self.db)
-        guild_id = await get_guild_id(ctx, self.db)
+        user_id, guild_id = await ensure_user_and_guild(ctx, self.db)
         movie_title = " ".join(movie_title_and_rating[:-1])
         existing_movie = await find_exact_movie(self.db, guild_id, movie_title)
         if not existing_movie:
@@ -182,6 +192,7 @@ class Core(DbMixin, commands.Cog):
             except asyncpg.exceptions.PostgresError as e:
                 print(f"Database error: {e}")
                 return await ctx.send("Ruh roh database error")
+            movie_catalogue.update(guild_id, existing_movie['id'], watched=1)
         else:
             # if movie has no date_watched, updated date_watched and watched
             try:
@@ -192,6 +203,7 @@ class Core(DbMixin, commands.Cog):
                     guild_id,
                     movie_title
                 )
+                movie_catalogue.update(guild_id, existing_movie['id'], watched=1, date_watched=current_time)
             except asyncpg.exceptions.PostgresError as e:
                 await ctx.send("Ruh roh database error")
                 print(f"Database error: {e}")
@@ -222,13 +234,14 @@ class Core(DbMixin, commands.Cog):
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
+        finally:
+            plot_cache.bump(guild_id) # the movie's watched/date_watched may have changed even if the rating write failed
         return await send_goodly(ctx, f"You rated '{existing_movie['title']}' {rating}/10.")
 
     @commands.command()
     async def unrate(self, ctx, *movie_title):
         """<movie title> — Remove rating."""
-        user_id = await get_user_id(ctx, self.db)
-        guild_id = await get_guild_id(ctx, self.db)
+        user_id, guild_id = await ensure_user_and_guild(ctx, self.db)
         movie_title = " ".join(movie_title)
 
         existing_movie = await find_exact_movie(self.db, guild_id, movie_title)
@@ -253,6 +266,7 @@ class Core(DbMixin, commands.Cog):
                 "DELETE FROM ratings WHERE guild_id=$1 AND user_id=$2 AND movie_id=$3",
                 guild_id, user_id, existing_movie["id"]
             )
+            plot_cache.bump(guild_id)
 
             # Are there any ratings left for this movie?
             any_left = await self.db.fetchval(
@@ -266,6 +280,8 @@ class Core(DbMixin, commands.Cog):
                     "UPDATE movies SET watched=$1, date_watched=$2 WHERE guild_id=$3 AND id=$4",
                     0, None, guild_id, existing_movie["id"]
                 )
+                movie_catalogue.update(guild_id, existing_movie["id"], watched=0, date_watched=None)
+                plot_cache.bump(guild_id)
                 return await send_goodly(
                     ctx,
                     f"You have removed the last rating from '{existing_movie['title']}' and so it has been returned to suggestions."
@@ -279,8 +295,7 @@ class Core(DbMixin, commands.Cog):
     @commands.command()
     async def review(self, ctx, movie_title, *review_text):
         """<movie title>" <review text> — Review a movie."""
-        user_id = await get_user_id(ctx, self.db)
-        guild_id = await get_guild_id(ctx, self.db)
+        user_id, guild_id = await ensure_user_and_guild(ctx, self.db)
         review_text = " ".join(review_text)
 
         existing_movie = await find_exact_movie(self.db, guild_id, movie_title)
@@ -310,6 +325,7 @@ class Core(DbMixin, commands.Cog):
                     "INSERT INTO reviews (guild_id, movie_id, user_id, review_text) VALUES ($1,$2,$3,$4)",
                     guild_id, existing_movie["id"], user_id, review_text
                 )
+            plot_cache.bump(guild_id)
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
@@ -342,13 +358,14 @@ class Core(DbMixin, commands.Cog):
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
+        movie_catalogue.update(guild_id, existing_movie['id'], user_id=user_id)
+        plot_cache.bump(guild_id)
         return await send_goodly(ctx, f"'{existing_movie['title']}' choosership has been transfered to '{username}'.")
 
     @commands.command()
     async def find(self, ctx, *user_input):
         """<search text> <[n,p]> — Search for users or movies."""
         guild_id = await get_guild_id(ctx, self.db)
-        guild_user_info = [[member.id, member.name] for member in ctx.message.guild.members]
         user_input, pagination = await parse_squarefucker(user_input)
         user_input = " ".join(user_input)
         # STEP 1) check if the input is user_id (i.e. <@3087243312874>)
@@ -365,11 +382,18 @@ class Core(DbMixin, commands.Cog):
                 return await send_goodly(ctx, message)
         
         # STEP 2) rank all usernames/movie titles against user input for match closeness
-        usernames = [(i[1].lower(), "username") for i in guild_user_info]
+        members = member_directory.get(ctx.message.guild)
         movies = await self._get_all_guild_movies(ctx)
-        movie_titles = [(row['title'].lower(), "movie") for row in movies]
-        full_search_list = usernames + movie_titles
-        ranked_matches = rank_matches(user_input, full_search_list)
+        if movies is None:
+            return
+        # without pagination only the best match gets shown, so the indexes can stop early
+        limit = None if pagination else 1
+        username_matches = [(name.lower(), "username", score) for name, _, score in members.search_index.rank(user_input, limit)]
+        ranked_matches = merge_rankings(
+            username_matches,
+            movies.search_index.rank(user_input, limit),
+            limit=limit
+        )
         # STEP 3) determine what to return based on pagination options
         if not pagination:
             matches = [ranked_matches[0]]
@@ -406,15 +430,14 @@ class Core(DbMixin, commands.Cog):
         return await ctx.send(f'"{user_input}" could not be found in movies or users.')
     
     async def _get_all_guild_movies(self, ctx):
-        """part of find()"""
+        """part of find(). returns the guild's GuildMovies from movie_catalogue, or None on a db error"""
         guild_id = await get_guild_id(ctx, self.db)
         try:
-            rows = await self.db.fetch("SELECT * FROM movies WHERE guild_id=$1", guild_id)
-            return rows
+            return await movie_catalogue.get(self.db, guild_id)
         except asyncpg.exceptions.PostgresError as e:
             await ctx.send("Ruh roh database error")
             print(f"Database error: {e}")
-            return []
+            return None
         
     async def _create_found_username_message(self, ctx, guild_id, user_id):
         """part of find()"""
@@ -464,10 +487,9 @@ class Core(DbMixin, commands.Cog):
         
     async def _create_found_movie_message(self, ctx, guild_id, matched_movie_title):    
         """part of find()"""
-        rows = await self.db.fetch("SELECT id, user_id, watched, date_watched FROM movies WHERE guild_id=$1 AND title=$2", guild_id, matched_movie_title)
-        if not rows:
+        movie = await find_exact_movie(self.db, guild_id, matched_movie_title)
+        if not movie:
             raise RuntimeError(f"Found {matched_movie_title} but couldn't get info on it for some reason. Bad!")
-        movie = rows[0]
         username = await user_id_to_username(ctx, movie['user_id'])
         if not username:
             username = str(movie['user_id'])
@@ -486,23 +508,19 @@ class Core(DbMixin, commands.Cog):
                     date_watched = date_watched.strftime("%Y-%m-%d")
             message = f"------ {matched_movie_title.upper()} ({username.upper()}) ({average:.1f})------\n" \
                       f"Date Watched: {date_watched}\n"
+            rater_usernames = await user_ids_to_usernames(ctx, [row['user_id'] for row in ratings])
             for row in ratings:
                 rating = '{:02.1f}'.format(float(row['rating']))
-                rater_username = await user_id_to_username(ctx, row['user_id'])
-                if not rater_username:
-                    rater_username = str(row['user_id'])
-                message += f"{rater_username}: {rating}\n"
+                message += f"{rater_usernames[row['user_id']]}: {rating}\n"
             return message
         else:
             message = f"------ {matched_movie_title.upper()} - {username.upper()} ------\n"
             endorsments = await self._get_movie_endorsments(guild_id, movie['id'])
             if endorsments:
                 message += "Endorsed by:\n"
+                endorsers = await user_ids_to_usernames(ctx, [row['user_id'] for row in endorsments])
                 for row in endorsments:
-                    endorser = await user_id_to_username(ctx, row['user_id'])
-                    if not endorser:
-                        endorser = str(row['user_id'])
-                    message += f"{endorser}\n"
+                    message += f"{endorsers[row['user_id']]}\n"
             else:
                 message += "No endorsments\n"
         return message
@@ -530,6 +548,8 @@ class Core(DbMixin, commands.Cog):
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
+        movie_catalogue.update(guild_id, existing_movie['id'], date_watched=date_watched)
+        plot_cache.bump(guild_id)
         return await send_goodly(ctx, f"date watched of {existing_movie['title']} has been changed to {date_watched.strftime('%Y-%m-%d')}.")
 
 class BrowseSuggestions(DbMixin, commands.Cog):
@@ -551,21 +571,21 @@ class BrowseSuggestions(DbMixin, commands.Cog):
         else:
             title_descriptor = "OLDEST"
         if not discord_id:
-            sql = """SELECT title, date_suggested, user_id FROM movies WHERE guild_id=$1 AND watched=$2 ORDER BY date_suggested desc"""
+            sql = """SELECT id, title, date_suggested, user_id FROM movies WHERE guild_id=$1 AND watched=$2"""
             sql_args = [guild_id, 0]
             title_from = "SERVER"
         else:
-            sql = """SELECT title, date_suggested FROM movies WHERE guild_id=$1 AND user_id=$2 AND watched=$3 ORDER BY date_suggested desc"""
+            sql = """SELECT id, title, date_suggested FROM movies WHERE guild_id=$1 AND user_id=$2 AND watched=$3"""
             sql_args = [guild_id, discord_id, 0]
             title_from = username
         try:
-            suggestions = await self.db.fetch(sql, *sql_args)
+            suggestions, _ = await fetch_page(self.db, sql, sql_args, ["date_suggested DESC", "id DESC"], pagination[0], pagination[1])
             if not suggestions:
                 return await ctx.send(f"No suggestions found for user {username}")
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
-        suggestions = await paginate(suggestions, pagination[0], pagination[1])
+        usernames = await user_ids_to_usernames(ctx, [suggestion['user_id'] for suggestion in suggestions if 'user_id' in suggestion])
         message = f"------ {title_descriptor} SUGGESTIONS FROM {title_from.upper()} ------\n"
         for suggestion in suggestions:
             if not suggestion['date_suggested']:
@@ -575,9 +595,7 @@ class BrowseSuggestions(DbMixin, commands.Cog):
             else:
                 date = suggestion['date_suggested']
             if "user_id" in suggestion:
-                username = await user_id_to_username(ctx, suggestion['user_id'])
-                username = str(suggestion['user_id']) if not username else username
-                message += f"{date} - {suggestion['title']} ({username})\n"
+                message += f"{date} - {suggestion['title']} ({usernames[suggestion['user_id']]})\n"
             else:
                 message += f"{date} - {suggestion['title']}\n"
         return await send_goodly(ctx, message)
@@ -618,16 +636,14 @@ class BrowseSuggestions(DbMixin, commands.Cog):
             title_from = username
 
         try:
-            suggestions = await self.db.fetch(sql, *sql_args)
+            suggestions, _ = await fetch_page(self.db, sql, sql_args, ["endorsement_count DESC", "date_suggested DESC", "id DESC"], pagination[0], pagination[1])
             if not suggestions:
                 return await ctx.send(f"No suggestions found for user {title_from}")
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
 
-        movies_chooser_endorsements = []
-        suggestions.sort(key=lambda x: x['endorsement_count'] or 0, reverse=True)
-        suggestions = await paginate(suggestions, pagination[0], pagination[1])
+        usernames = await user_ids_to_usernames(ctx, [suggestion['user_id'] for suggestion in suggestions if 'user_id' in suggestion])
         message = f"------ {title_descriptor}-ENDORSED MOVIES FROM {title_from.upper()}------\n"
         for suggestion in suggestions:
             if not suggestion['date_suggested']:
@@ -637,9 +653,7 @@ class BrowseSuggestions(DbMixin, commands.Cog):
             else:
                 date = suggestion['date_suggested']
             if "user_id" in suggestion:
-                username = await user_id_to_username(ctx, suggestion['user_id'])
-                username = str(suggestion['user_id']) if not username else username
-                message += f"{date} - {suggestion['title']} ({username}) ({suggestion['endorsement_count']})\n"
+                message += f"{date} - {suggestion['title']} ({usernames[suggestion['user_id']]}) ({suggestion['endorsement_count']})\n"
             else:
                 message += f"{date} - {suggestion['title']} ({suggestion['endorsement_count']})"
         return await send_goodly(ctx, message)
@@ -665,18 +679,17 @@ class BrowseSuggestions(DbMixin, commands.Cog):
             if not username:
                 username = str(discord_id)
         try:
-            endorsements = await self.db.fetch("""
-                SELECT movies.title, endorsements.date FROM movies
+            endorsements, _ = await fetch_page(self.db, """
+                SELECT endorsements.id, movies.title, endorsements.date FROM movies
                 INNER JOIN endorsements ON endorsements.movie_id = movies.id
-                WHERE endorsements.guild_id=$1 AND endorsements.user_id=$2 and watched=$3 ORDER BY endorsements.date desc""",
-                guild_id, discord_id, 0
+                WHERE endorsements.guild_id=$1 AND endorsements.user_id=$2 and watched=$3""",
+                [guild_id, discord_id, 0], ["date DESC", "id DESC"], pagination[0], pagination[1]
             )
             if not endorsements:
                 return await ctx.send(f"No endorsements found for user {username}")
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
-        endorsements = await paginate(endorsements, pagination[0], pagination[1])
         message = f"------ {title_descriptor} ENDORSEMENTS FROM {username.upper()} ------\n"
         for endorsement in endorsements:
             if not endorsement['date']:
@@ -734,8 +747,7 @@ class BrowseMovienights(DbMixin, commands.Cog):
                      JOIN ratings ON movies.id=ratings.movie_id
                      WHERE movies.guild_id=$1
                        AND watched=$2
-                     GROUP BY movies.id
-                     ORDER BY movies.date_watched DESC"""
+                     GROUP BY movies.id"""
             sql_args = [guild_id, 1]
             title_from = "SERVER"
         else:
@@ -749,19 +761,17 @@ class BrowseMovienights(DbMixin, commands.Cog):
                      WHERE movies.guild_id=$1
                        AND watched=$2
                        AND movies.user_id=$3
-                     GROUP BY movies.id
-                     ORDER BY movies.date_watched DESC"""
+                     GROUP BY movies.id"""
             sql_args = [guild_id, 1, discord_id]
             title_from = username
         try:
-            movies = await self.db.fetch(sql, *sql_args)
+            movies, _ = await fetch_page(self.db, sql, sql_args, ["date_watched DESC", "id DESC"], pagination[0], pagination[1])
             if not movies:
                 return await ctx.send(f"No watched movies found for user {username}")
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
-        movie_ids = [movie['id'] for movie in movies] 
-        movies = await paginate(movies, pagination[0], pagination[1])
+        usernames = await user_ids_to_usernames(ctx, [movie['user_id'] for movie in movies if 'user_id' in movie])
         message = f"------ {title_descriptor} MOVIENIGHTS FROM {title_from.upper()} ------\n"
         for movie in movies:
             average = movie['avg_rating'] if movie['avg_rating'] else 0.0
@@ -771,9 +781,7 @@ class BrowseMovienights(DbMixin, commands.Cog):
             else:
                 date_watched = date_watched.strftime("%Y-%m-%d")
             if 'user_id' in movie:
-                username = await user_id_to_username(ctx, movie['user_id'])
-                username = str(movie['user_id']) if not username else username
-                message += f"{date_watched} - {movie['title']} ({username}): {average:.1f}\n"
+                message += f"{date_watched} - {movie['title']} ({usernames[movie['user_id']]}): {average:.1f}\n"
             else:
                 message += f"{date_watched} - {movie['title']}: {average:.1f}\n"
         return await send_goodly(ctx, message)
@@ -822,14 +830,13 @@ class BrowseMovienights(DbMixin, commands.Cog):
             sql_args = [guild_id, 1, discord_id]
             title_from = username
         try:
-            movies = await self.db.fetch(sql, *sql_args)
+            movies, _ = await fetch_page(self.db, sql, sql_args, ["avg_rating DESC", "date_watched DESC", "id DESC"], pagination[0], pagination[1])
             if not movies:
                 return await ctx.send(f"No watched movies found for user {username}")
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
-        movies.sort(key=lambda x: x['avg_rating'] or 0, reverse=True)
-        movies = await paginate(movies, pagination[0], pagination[1])
+        usernames = await user_ids_to_usernames(ctx, [movie['user_id'] for movie in movies if 'user_id' in movie])
         message = f"------ {title_descriptor}-RATED MOVIENIGHTS FROM {title_from.upper()} ------\n"
         for movie in movies:
             average = movie['avg_rating']
@@ -841,9 +848,7 @@ class BrowseMovienights(DbMixin, commands.Cog):
             else:
                 date_watched = date_watched.strftime("%Y-%m-%d")
             if 'user_id' in movie:
-                username = await user_id_to_username(ctx, movie['user_id'])
-                username = str(movie['user_id']) if not username else username
-                message += f"{date_watched} - {movie['title']} ({username}): {average:.1f}\n"
+                message += f"{date_watched} - {movie['title']} ({usernames[movie['user_id']]}): {average:.1f}\n"
             else:
                 message += f"{date_watched} - {movie['title']}: {average:.1f}\n"
         return await send_goodly(ctx, message)
@@ -869,19 +874,17 @@ class BrowseMovienights(DbMixin, commands.Cog):
             if not username:
                 username = str(discord_id)
         try:
-            ratings = await self.db.fetch("""
-                SELECT movies.title, movies.date_watched, ratings.rating FROM ratings
+            ratings, _ = await fetch_page(self.db, """
+                SELECT ratings.id, movies.title, movies.date_watched, ratings.rating, AVG(ratings.rating) OVER() AS overall_average FROM ratings
                 INNER JOIN movies ON ratings.movie_id = movies.id
-                WHERE ratings.guild_id=$1 AND ratings.user_id=$2
-                ORDER BY movies.date_watched desc""", guild_id, discord_id)
+                WHERE ratings.guild_id=$1 AND ratings.user_id=$2""",
+                [guild_id, discord_id], ["date_watched DESC", "id DESC"], pagination[0], pagination[1])
             if not ratings:
                 return await ctx.send(f"No ratings found for user {username}")
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
-        all_ratings_from_rater = [row['rating'] for row in ratings]
-        overall_average = sum(all_ratings_from_rater)/len(all_ratings_from_rater)
-        ratings = await paginate(ratings, pagination[0], pagination[1])
+        overall_average = ratings[0]['overall_average']
         message = f"{title_descriptor} RATINGS FROM {username.upper()} (avg: {overall_average:.1f})\n"
         for rating in ratings:
             date_watched = rating['date_watched']
@@ -913,20 +916,17 @@ class BrowseMovienights(DbMixin, commands.Cog):
             if not username:
                 username = str(discord_id)
         try:
-            ratings = await self.db.fetch("""
-                SELECT movies.title, movies.date_watched, ratings.rating FROM ratings
+            ratings, _ = await fetch_page(self.db, """
+                SELECT ratings.id, movies.title, movies.date_watched, ratings.rating, AVG(ratings.rating) OVER() AS overall_average FROM ratings
                 INNER JOIN movies ON ratings.movie_id = movies.id
                 WHERE ratings.guild_id=$1 AND ratings.user_id=$2""",
-                guild_id, discord_id)
+                [guild_id, discord_id], ["rating DESC", "date_watched DESC", "id DESC"], pagination[0], pagination[1])
             if not ratings:
                 return await ctx.send(f"No ratings found for user {username}")
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
-        all_ratings_from_rater = [row['rating'] for row in ratings]
-        overall_average = sum(all_ratings_from_rater)/len(all_ratings_from_rater)
-        ratings.sort(key = lambda x: x['rating'], reverse=True)
-        ratings = await paginate(ratings, pagination[0], pagination[1])
+        overall_average = ratings[0]['overall_average']
         message = f"{title_descriptor} RATINGS FROM {username.upper()} (avg: {overall_average:.1f})\n"
         for rating in ratings:
             date_watched = rating['date_watched']
@@ -954,18 +954,16 @@ class BrowseMovienights(DbMixin, commands.Cog):
             if not username:
                 username = str(discord_id)
         try:
-            unrated_movies = await self.db.fetch("""
-                SELECT title, date_watched from movies WHERE guild_id=$1 AND watched=$2 AND id NOT IN
-                (SELECT DISTINCT movie_id FROM ratings WHERE guild_id=$3 AND user_id=$4)
-                ORDER BY date_watched desc""",
-                guild_id, 1, guild_id, discord_id
+            unrated_movies, _ = await fetch_page(self.db, """
+                SELECT id, title, date_watched from movies WHERE guild_id=$1 AND watched=$2 AND id NOT IN
+                (SELECT DISTINCT movie_id FROM ratings WHERE guild_id=$3 AND user_id=$4)""",
+                [guild_id, 1, guild_id, discord_id], ["date_watched DESC", "id DESC"], pagination[0], pagination[1]
             )
             if not unrated_movies:
                 return await ctx.send(f"No unrated movies found for user {username}")
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
-        unrated_movies = await paginate(unrated_movies, pagination[0], pagination[1])
         message = f"------ UNRATED MOVIES FROM {username.upper()} ------\n"
         for movie in unrated_movies:
             date_watched = movie['date_watched']
@@ -981,7 +979,6 @@ class BrowseMovienights(DbMixin, commands.Cog):
         """<search text> <[n,p]> — Search for reviews."""
         # uses diff user input parsing cus it expects a list of keywords
         guild_id = await get_guild_id(ctx, self.db)
-        guild_user_info = [[member.id, member.name] for member in ctx.message.guild.members]
         user_input, pagination = await parse_squarefucker(user_input)
         if not pagination:
             pagination = (5,1)
@@ -997,121 +994,113 @@ class BrowseMovienights(DbMixin, commands.Cog):
             else:
                 search_terms.append(i)
                 
-        guild_reviews = await self._get_all_guild_reviews(ctx)
-        review_scores = []
+        # the db narrows the guild's reviews down to the best few candidates, then only those get the fuzzy scoring.
+        # a negative page size asks for the worst matches, and those can only be found by scoring every review
+        if pagination[0] < 0:
+            candidate_limit = None
+        else:
+            candidate_limit = max(REVIEW_CANDIDATES, abs(pagination[0]) * abs(pagination[1]))
+        reviewer_ids = _reviewer_ids_matching(member_directory.get(ctx.guild), search_terms)
+        guild_reviews = await self._get_review_candidates(ctx, guild_id, search_terms, mention_user_ids, reviewer_ids, candidate_limit)
+        reviewer_names = await user_ids_to_usernames(ctx, [review['user_id'] for review in guild_reviews])
+        review_targets = []
         for review in guild_reviews:
-            review_score = 0 
-            search_terms_copy = search_terms.copy()
-            primary_targets = []
-            secondary_targets = review['review_text'].split(" ")
+            review['reviewer_name'] = reviewer_names[review['user_id']]  # add to review dict so it can be accessed later
+            primary_targets = review['title'].split(" ")
             matched_reviewer_by_mention = None  # score 100% on reviewer if a mention matches
-            primary_target_matches = []
-            secondary_target_matches = []
-            primary_target_misses = []  # unmatched words which will reduce final score
-            # build primary targets (movie title + reviewer name)
-            movie = await self._find_movie_by_id(self.db, guild_id, review['movie_id'])
-            review['movie'] = movie  # add to review dict so it can be accessed later
-            primary_targets += movie['title'].split(" ")
-            reviewer_name = await user_id_to_username(ctx, review['user_id'])
-            if not reviewer_name:
-                reviewer_name = str(review['user_id'])
-            review['reviewer_name'] = reviewer_name  # add to review dict so it can be accessed later
             if review['user_id'] in mention_user_ids:
                 # if matching mention provided, dont include reviewer name in primary targets 
                 matched_reviewer_by_mention = review['user_id']
             else:
-                primary_targets += reviewer_name.split(" ")
+                primary_targets += review['reviewer_name'].split(" ")
+            secondary_targets = review['review_text'].split(" ")
+            review_targets.append((review, primary_targets, secondary_targets, matched_reviewer_by_mention))
             
-            while primary_targets:
-                matching_search_terms_for_target = []
-                for target in primary_targets:
-                    matching_search_term, score = find_closest_match_and_score(target, search_terms_copy) # default threshold is 50% 
-                    if matching_search_term:
-                        matching_search_terms_for_target.append((matching_search_term, score, target))
-                if matching_search_terms_for_target:
-                    # keep only the highest matching_search_term and then restart the loop
-                    highest_matching_search_term, score, target = max(matching_search_terms_for_target, key=lambda x: x[1])
-                    primary_target_matches.append((highest_matching_search_term, score))
-                    search_terms_copy.remove(highest_matching_search_term) # removes the just word once, in the case that there are multiples of it
-                    primary_targets.remove(target)
-                else:
-                    # no matching_search_term, all targets can be disregarded
-                    primary_target_misses += primary_targets
-                    primary_targets = []
-            if search_terms_copy:
-            # if there are still words left, that means that the matching against the movie title/reviewer name
-                # didn't exhaust the user's inputs, so we should look in review text as well
-                while secondary_targets:                
-                    matching_search_terms_for_target = []
-                    for target in secondary_targets:
-                        matching_search_term, score = find_closest_match_and_score(target, search_terms_copy) # default threshold is 50% 
-                        if matching_search_term:
-                            matching_search_terms_for_target.append((matching_search_term, score, target))
-                    if matching_search_terms_for_target:
-                        highest_matching_search_term, score, target = max(matching_search_terms_for_target, key=lambda x: x[1])
-                        secondary_target_matches.append((highest_matching_search_term, score))
-                        search_terms_copy.remove(highest_matching_search_term)
-                        secondary_targets.remove(target)
-                    else:
-                        # no matching_search_term, all targets can be disregarded
-                        secondary_targets = []
-            # calc score
-            review_score = 0
-            primary_target_score = 0
-            primary_target_match_length = 0
-            primary_target_miss_length = 0
-            for word, score in primary_target_matches:
-                primary_target_match_length += len(word) * score  # score is a number from 0-1 that measures how closely the user's search term matched the target word
-            primary_target_miss_length = sum([len(i) for i in primary_target_misses])
-            primary_target_score = 100 * primary_target_match_length / (primary_target_match_length + primary_target_miss_length)
-            if matched_reviewer_by_mention:
-                primary_target_score = primary_target_score / 2 # change max score from primary to 50 instead of 100
-                primary_target_score += 50
-            secondary_target_score = 0
-            for word, score in secondary_target_matches:
-                secondary_target_score += len(word) * score * 5 # up to 5 points per letter of matching words. "i hated this movie" = 15 chars = 75 points.
-            for word in search_terms_copy:
-                # remaining unmatched search terms from user input
-                secondary_target_score -= len(word) * 5
-            if secondary_target_score < 0:
-                secondary_target_score = 0      
-            review_score = primary_target_score + secondary_target_score
+        # every search term gets scored against every distinct candidate word once, instead of once per word per review
+        token_index = SearchIndex((token, "word") for token in {t for _, primary, secondary, _ in review_targets for t in primary + secondary})
+        term_scores = {term: token_index.scores(term) for term in set(search_terms)}
+        
+        review_scores = []
+        for review, primary_targets, secondary_targets, matched_reviewer_by_mention in review_targets:
+            review_score = _score_review(primary_targets, secondary_targets, search_terms, matched_reviewer_by_mention, term_scores)
             review_scores.append((review, review_score))
             
         reviews = sorted(review_scores, key=lambda x: x[1], reverse=True)
         reviews = await paginate(reviews, pagination[0], pagination[1])
         message = "------ SEARCH RESULTS FROM REVIEWS ------\n"
         for review, _ in reviews:
-            ratings = await get_ratings_for_movie_ids(self.db, ctx, guild_id, [review['movie']['id']])
-            reviewer_rating = [i for i in ratings if i['user_id']==review['user_id']]
-            if reviewer_rating:
-                reviewer_rating = reviewer_rating[0]['rating']
-            message += f"{review['movie']['title'].upper()} - {reviewer_rating}/10\n- by {review['reviewer_name']}\n{review['review_text']}\n{'-'*60}\n"
+            reviewer_rating = review['rating'] if review['rating'] is not None else "?"
+            message += f"{review['title'].upper()} - {reviewer_rating}/10\n- by {review['reviewer_name']}\n{review['review_text']}\n{'-'*60}\n"
         return await send_goodly(ctx, message)
          
-    async def _get_all_guild_reviews(self, ctx):
-        guild_id = await get_guild_id(ctx, self.db)
+    async def _get_review_candidates(self, ctx, guild_id, search_terms, mention_user_ids, reviewer_ids, limit):
+        """the guild's reviews most likely to match, best first, as dicts with the movie title and the reviewer's rating. part of reviews()
+        a review is a candidate if its text matches a search term (reviews.review_tsv, GIN indexed), its text or movie title
+        is trigram-similar to a search term so typos still match (GIN indexed), or it's by a mentioned/name-matched user.
+        limit=None skips the narrowing and returns every review in the guild"""
+        review_select = "reviews.id, reviews.user_id, reviews.movie_id, reviews.review_text, movies.title, ratings.rating"
+        review_joins = """reviews
+                INNER JOIN movies ON reviews.movie_id = movies.id
+                LEFT JOIN ratings ON ratings.movie_id = reviews.movie_id
+                                 AND ratings.user_id = reviews.user_id
+                                 AND ratings.guild_id = reviews.guild_id"""
+        title_terms = [term.lower() for term in search_terms]
+        user_ids = list(set(mention_user_ids) | set(reviewer_ids))
         try:
-            rows = await self.db.fetch("SELECT * FROM reviews WHERE guild_id=$1", guild_id)
-            return rows
+            if limit is None:
+                rows = await self.db.fetch(f"""
+                    SELECT {review_select}
+                    FROM {review_joins}
+                    WHERE reviews.guild_id=$1
+                    ORDER BY reviews.id""",
+                    guild_id
+                )
+            elif not title_terms and not user_ids:
+                # nothing to search by, so there's nothing to rank on either
+                rows = await self.db.fetch(f"""
+                    SELECT {review_select}
+                    FROM {review_joins}
+                    WHERE reviews.guild_id=$1
+                    ORDER BY reviews.date DESC, reviews.id DESC
+                    LIMIT $2""",
+                    guild_id, limit
+                )
+            else:
+                rows = await self.db.fetch(f"""
+                    WITH search AS (SELECT to_tsquery('simple', $2) AS query),
+                    matched AS (
+                        SELECT reviews.id FROM reviews, search
+                        WHERE reviews.guild_id=$1 AND reviews.review_tsv @@ search.query
+                        UNION
+                        SELECT reviews.id FROM reviews
+                        INNER JOIN movies ON reviews.movie_id = movies.id
+                        WHERE reviews.guild_id=$1 AND lower(movies.title::text) %> ANY($3::text[])
+                        UNION
+                        SELECT reviews.id FROM reviews
+                        WHERE reviews.guild_id=$1 AND lower(reviews.review_text) %> ANY($3::text[])
+                        UNION
+                        SELECT reviews.id FROM reviews
+                        WHERE reviews.guild_id=$1 AND reviews.user_id = ANY($4::bigint[])
+                    )
+                    SELECT {review_select}
+                    FROM {review_joins}
+                    INNER JOIN matched ON matched.id = reviews.id
+                    CROSS JOIN search
+                    ORDER BY
+                        ts_rank(reviews.review_tsv, search.query)
+                        + COALESCE((SELECT MAX(word_similarity(term, lower(movies.title::text))) FROM unnest($3::text[]) AS term), 0)
+                        + COALESCE((SELECT MAX(word_similarity(term, lower(reviews.review_text))) FROM unnest($3::text[]) AS term), 0)
+                        + CASE WHEN reviews.user_id = ANY($4::bigint[]) THEN 1 ELSE 0 END DESC,
+                        reviews.id
+                    LIMIT $5""",
+                    guild_id, _review_tsquery(search_terms), title_terms, user_ids, limit
+                )
+            return [dict(row) for row in rows]
         except asyncpg.exceptions.PostgresError as e:
             await ctx.send("Ruh roh database error")
             print(f"Database error: {e}")
             return []
-     
-         
-    async def _find_movie_by_id(self, db, guild_id, movie_id):
-        """finds movie by its id()"""
-        try:
-            rows = await db.fetch("SELECT * FROM movies WHERE guild_id=$1 AND id=$2", guild_id, movie_id)
-            if rows:
-                return rows[0]
-            else:
-                return None
-        except asyncpg.exceptions.PostgresError as e:
-            print(f"Database error: {e}")
-            return None
-        
+            
     @commands.command()
     async def standings(self, ctx, *user_input):
         """<[n,p]> — Chooser rankings (avg rating received)."""
@@ -1120,48 +1109,28 @@ class BrowseMovienights(DbMixin, commands.Cog):
         if not pagination:
             pagination = (15,1)
         try:
-            watched_movies = await self.db.fetch("""
-                SELECT movies.user_id, movies.title, ratings.rating FROM ratings
+            standings_data, _ = await fetch_page(self.db, """
+                SELECT
+                  movies.user_id,
+                  AVG(ratings.rating) AS average_rating,
+                  COUNT(DISTINCT movies.id) AS movie_count
+                FROM ratings
                 INNER JOIN movies ON ratings.movie_id=movies.id
-                WHERE movies.guild_id=$1 AND movies.watched=$2""",\
-                guild_id, 1)
-            if not watched_movies:
+                WHERE movies.guild_id=$1 AND movies.watched=$2
+                GROUP BY movies.user_id""",
+                [guild_id, 1], ["average_rating DESC", "user_id ASC"], pagination[0], pagination[1])
+            if not standings_data:
                 return await ctx.send(f"No watched movies found in this server")
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
-        watched_movies.sort(key=lambda x: str(x['user_id']))
-        standings_data = []
-        ratings_for_current_chooser = []
-        for row in watched_movies:
-            if len(ratings_for_current_chooser) == 0:
-                current_chooser = row['user_id']
-                ratings_for_current_chooser = [row['rating']]
-                titles = [row['title']]
-            else:
-                if row['user_id'] == current_chooser:
-                    ratings_for_current_chooser.append(row['rating'])
-                    titles.append(row['title'])
-                else:
-                    average_rating = sum(ratings_for_current_chooser) / len(ratings_for_current_chooser)
-                    movie_count = len(set(titles))
-                    standings_data.append([current_chooser, average_rating, movie_count])
-                    current_chooser = row['user_id']
-                    ratings_for_current_chooser = [row['rating']]
-                    titles = [row['title']]
-        average_rating = sum(ratings_for_current_chooser) / len(ratings_for_current_chooser)
-        movie_count = len(set(titles))
-        standings_data.append([current_chooser, average_rating, movie_count])
-        standings_data.sort(key=lambda x: float(x[1]), reverse=True)
-        standings_data = await paginate(standings_data, pagination[0], pagination[1])
+        standings_data = [(row['user_id'], row['average_rating'], row['movie_count']) for row in standings_data]
+        usernames = await user_ids_to_usernames(ctx, [user_id for user_id, _, _ in standings_data])
         message = "------ OVERALL STANDINGS ------\n"
         for user_id, average_rating, movie_count in standings_data:
             if movie_count > 0:
                 average = '{:02.1f}'.format(float(average_rating))
-                username = await user_id_to_username(ctx, user_id)
-                if not username:
-                    username = str(user_id)
-                message += f"{username} ({str(movie_count)}): {average}\n"
+                message += f"{usernames[user_id]} ({str(movie_count)}): {average}\n"
         return await send_goodly(ctx, message)
 
     @commands.command()
@@ -1176,7 +1145,7 @@ class BrowseMovienights(DbMixin, commands.Cog):
         else:
             title_descriptor = "SMALLEST"
         try:
-            movies = await self.db.fetch("""
+            movies, _ = await fetch_page(self.db, """
                 SELECT
                   movies.id,
                   movies.title,
@@ -1188,23 +1157,19 @@ class BrowseMovienights(DbMixin, commands.Cog):
                 JOIN ratings ON movies.id=ratings.movie_id
                 WHERE movies.guild_id=$1
                   AND watched=$2
-                GROUP BY movies.id
-                ORDER BY movies.date_watched DESC""", guild_id, 1)
+                GROUP BY movies.id""",
+                [guild_id, 1], ["attendance DESC", "date_watched DESC", "id DESC"], pagination[0], pagination[1])
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
-        movies.sort(key=lambda x: x['attendance'], reverse=True)
-        movies = await paginate(movies, pagination[0], pagination[1])
+        usernames = await user_ids_to_usernames(ctx, [movie['user_id'] for movie in movies])
         message = f"------ {title_descriptor} MOVIE NIGHTS ------\n"
         for movie in movies:
             if not movie['date_watched']:
                 date_watched = "????-??-??"
             else:
                 date_watched = movie['date_watched'].strftime("%Y-%m-%d")
-            username = await user_id_to_username(ctx, movie['user_id'])
-            if not username:
-                username = str(movie['user_id'])
-            message += f"{date_watched} {movie['title']} ({username}): {movie['attendance']}\n"
+            message += f"{date_watched} {movie['title']} ({usernames[movie['user_id']]}): {movie['attendance']}\n"
         return await send_goodly(ctx, message)
 
     @commands.command()
@@ -1233,6 +1198,33 @@ class Scraping(commands.Cog):
 class Plotting(DbMixin, commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        
+    async def cog_load(self):
+        await plot_executor.start()
+        
+    async def cog_unload(self):
+        plot_executor.shutdown()
+        
+    async def _send_plot(self, ctx, filename, func_name, *args, cache_key=None):
+        """render plotting.<func_name>(*args) in the plot workers and send it. errors raised by the plot itself are left to the caller"""
+        try:
+            png = await plot_executor.render(func_name, *args)
+        except PlotQueueFull:
+            return await ctx.send("Too many plots cooking rn, try again in a bit")
+        except asyncio.TimeoutError:
+            return await ctx.send("Plot took too long so I gave up on it")
+        if cache_key:
+            plot_cache.put(cache_key, png)
+        return await ctx.send(file=File(fp=io.BytesIO(png), filename=filename))
+        
+    async def _send_cached_plot(self, ctx, filename, cache_key):
+        """send the cached png for cache_key if there is one. returns False on a miss"""
+        png = plot_cache.get(cache_key)
+        if png is None:
+            return False
+        await ctx.send(file=File(fp=io.BytesIO(png), filename=filename))
+        return True
+        
     @commands.command()
     async def plot_ratings(self, ctx, *user_input):
         """<name or mention> — Plot ratings from a user."""
@@ -1244,6 +1236,10 @@ class Plotting(DbMixin, commands.Cog):
             return await ctx.send("Ruh roh user input error")
         if not discord_id:
             discord_id = ctx.message.author.id
+        # the rows handed to the plot carry usernames, so a rename has to miss too
+        cache_key = plot_cache.key(guild_id, "plot_ratings", discord_id, member_directory.get(ctx.message.guild).version)
+        if await self._send_cached_plot(ctx, "ratings_plot.png", cache_key):
+            return
         try:
             ratings = await self.db.fetch("""
                 SELECT movies.title, movies.user_id, movies.date_watched, ratings.rating FROM ratings
@@ -1256,16 +1252,12 @@ class Plotting(DbMixin, commands.Cog):
         except asyncpg.exceptions.PostgresError as e:
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
-        user_ids_and_names = {}
+        user_ids_and_names = await user_ids_to_usernames(ctx, [r['user_id'] for r in ratings])
         rows = []
         for r in ratings:
-            name = user_ids_and_names.get(r['user_id']) or await user_id_to_username(ctx, r['user_id']) or str(r['user_id'])
-            if name is None:
-                name = await user_id_to_username(ctx, owner_id) or str(owner_id)
-                user_ids_and_names[owner_id] = name
+            name = user_ids_and_names[r['user_id']]
             rows.append({'title': r['title'], 'user_id': r['user_id'], 'date_watched': r['date_watched'], 'rating': r['rating'], 'username': name})            
-        image_buffer = plotting.plot_ratings_to_users(rows)
-        return await ctx.send(file=File(fp=image_buffer, filename="ratings_plot.png"))        
+        return await self._send_plot(ctx, "ratings_plot.png", "plot_ratings_to_users", rows, cache_key=cache_key)        
         
     @commands.command()
     async def plot_movienights(self, ctx, *user_input):
@@ -1276,6 +1268,9 @@ class Plotting(DbMixin, commands.Cog):
         except Exception as e:
             print(f"Parsing User Input error: {e}")
             return await ctx.send("Ruh roh user input error")
+        cache_key = plot_cache.key(guild_id, "plot_movienights", discord_id)
+        if await self._send_cached_plot(ctx, "movienights_plot.png", cache_key):
+            return
         if not discord_id:
             sql = """SELECT
                         movies.id,
@@ -1330,8 +1325,7 @@ class Plotting(DbMixin, commands.Cog):
             else:
                 attendance = 0
             data.append((date_watched, average, attendance))
-        image_buffer = plotting.plot_movienights(data)
-        return await ctx.send(file=File(fp=image_buffer, filename="movienights_plot.png"))        
+        return await self._send_plot(ctx, "movienights_plot.png", "plot_movienights", data, cache_key=cache_key)        
         
         
     @commands.command()
@@ -1348,6 +1342,10 @@ class Plotting(DbMixin, commands.Cog):
             username = await user_id_to_username(ctx, discord_id)
             if not username:
                 username = str(discord_id)
+        # the bars are labelled with owner usernames, so a rename has to miss too
+        cache_key = plot_cache.key(guild_id, "plot_favorites", discord_id, member_directory.get(ctx.message.guild).version)
+        if await self._send_cached_plot(ctx, "ratings_plot.png", cache_key):
+            return
         try:
             ratings = await self.db.fetch("""
                 SELECT
@@ -1367,13 +1365,7 @@ class Plotting(DbMixin, commands.Cog):
             print(f"Database error: {e}")
             return await ctx.send("Ruh roh database error")
             
-        owner_ids_to_username = {}
-        owner_ids = list(set([i['movie_owner'] for i in ratings]))
-        for i in owner_ids:
-            username = await user_id_to_username(ctx, i)
-            if not username:
-                username = str(i)
-            owner_ids_to_username[i] = username
+        owner_ids_to_username = await user_ids_to_usernames(ctx, [i['movie_owner'] for i in ratings])
             
         owner_ratings = defaultdict(list)
         for row in ratings:
@@ -1393,13 +1385,15 @@ class Plotting(DbMixin, commands.Cog):
         for owner, rating_list in user_ratings_given_to_each_owner.items():
             user_avg_rating[owner] = sum(rating_list) / len(rating_list)
             
-        image_buffer = plotting.plot_favorites(owner_avg_rating, user_avg_rating)
-        return await ctx.send(file=File(fp=image_buffer, filename="ratings_plot.png"))        
+        return await self._send_plot(ctx, "ratings_plot.png", "plot_favorites", owner_avg_rating, user_avg_rating, cache_key=cache_key)        
         
     @commands.command()
     async def plot_user_similarity(self, ctx, min_common: int = 5):
         """<min_common> — Plot user rating similarity matrix. min_common (default 5) is minimum movies in common."""
         guild_id = await get_guild_id(ctx, self.db)
+        cache_key = plot_cache.key(guild_id, "plot_user_similarity", min_common)
+        if await self._send_cached_plot(ctx, "user_similarity.png", cache_key):
+            return
         try:
             ratings = await self.db.fetch("""
                 SELECT ratings.user_id, ratings.movie_id, ratings.rating
@@ -1427,8 +1421,8 @@ class Plotting(DbMixin, commands.Cog):
             return await ctx.send("Ruh roh database error")
 
         try:
-            image_buffer = plotting.plot_user_similarity(ratings, min_common)
-            return await ctx.send(file=File(fp=image_buffer, filename="user_similarity.png"))
+            # records don't pickle, dicts do
+            return await self._send_plot(ctx, "user_similarity.png", "plot_user_similarity", [dict(r) for r in ratings], min_common, cache_key=cache_key)
         except ValueError as e:
             return await ctx.send(str(e))
         except Exception as e:
@@ -1439,8 +1433,7 @@ class Plotting(DbMixin, commands.Cog):
     async def plot_user_similarity_test(self, ctx):
         """Test the similarity plot with synthetic data."""
         try:
-            image_buffer = plotting.plot_user_similarity_test()
-            return await ctx.send(file=File(fp=image_buffer, filename="user_similarity_test.png"))
+            return await self._send_plot(ctx, "user_similarity_test.png", "plot_user_similarity_test")
         except Exception as e:
             print(f"Test plotting error: {e}")
             return await ctx.send(f"Test plot failed with error: {str(e)}")
@@ -1455,6 +1448,9 @@ class Plotting(DbMixin, commands.Cog):
         movie = await find_exact_movie(self.db, guild_id, movie_title)
         if not movie:
             return await ctx.send(f"The movie' {movie_title}' doesn't exist.")
+        cache_key = plot_cache.key(guild_id, "plot_movie_spread", movie['id'])
+        if await self._send_cached_plot(ctx, "movie_spread.png", cache_key):
+            return
             
         # Get all ratings for this movie
         try:
@@ -1471,40 +1467,109 @@ class Plotting(DbMixin, commands.Cog):
             return await ctx.send("Ruh roh database error")
 
         try:
-            image_buffer = plotting.plot_movie_spread(movie, ratings)
-            return await ctx.send(file=File(fp=image_buffer, filename="movie_spread.png"))
+            return await self._send_plot(ctx, "movie_spread.png", "plot_movie_spread", movie, [dict(r) for r in ratings], cache_key=cache_key)
         except Exception as e:
             print(f"Plotting error: {e}")
             return await ctx.send("Failed to generate plot.")
 
+def _review_tsquery(search_terms):
+    """'term1:* | term2:*' for to_tsquery(). anything that isn't a word character is dropped so user input can't break the query syntax"""
+    words = [re.sub(r"\W", "", term.lower()) for term in search_terms]
+    return " | ".join(f"{word}:*" for word in words if word)
+    
+def _reviewer_ids_matching(members, search_terms, threshold=0.5):
+    """ids of guild members with a word in their name that matches any search term, same as the per-word
+    scoring reviews() does on reviewer names. names only live in discord, so the db can't match them. part of reviews()"""
+    user_ids = set()
+    for term in set(search_terms):
+        user_ids.update(user_id for _, user_id, score in members.word_index.rank(term) if score > threshold)
+    return user_ids
+    
+def _score_review(primary_targets, secondary_targets, search_terms, matched_reviewer_by_mention, term_scores):
+    """part of reviews(). scores one review against the user's search terms.
+    term_scores is {search term: {word: score}} from the review token index"""
+    search_terms_copy = list(search_terms)
+    primary_targets = list(primary_targets)
+    secondary_targets = list(secondary_targets)
+    primary_target_matches = []
+    secondary_target_matches = []
+    primary_target_misses = []  # unmatched words which will reduce final score
+    while primary_targets:
+        matching_search_terms_for_target = []
+        for target in primary_targets:
+            matching_search_term, score = _closest_search_term(target, search_terms_copy, term_scores) # default threshold is 50% 
+            if matching_search_term:
+                matching_search_terms_for_target.append((matching_search_term, score, target))
+        if matching_search_terms_for_target:
+            # keep only the highest matching_search_term and then restart the loop
+            highest_matching_search_term, score, target = max(matching_search_terms_for_target, key=lambda x: x[1])
+            primary_target_matches.append((highest_matching_search_term, score))
+            search_terms_copy.remove(highest_matching_search_term) # removes the just word once, in the case that there are multiples of it
+            primary_targets.remove(target)
+        else:
+            # no matching_search_term, all targets can be disregarded
+            primary_target_misses += primary_targets
+            primary_targets = []
+    if search_terms_copy:
+    # if there are still words left, that means that the matching against the movie title/reviewer name
+        # didn't exhaust the user's inputs, so we should look in review text as well
+        while secondary_targets:                
+            matching_search_terms_for_target = []
+            for target in secondary_targets:
+                matching_search_term, score = _closest_search_term(target, search_terms_copy, term_scores) # default threshold is 50% 
+                if matching_search_term:
+                    matching_search_terms_for_target.append((matching_search_term, score, target))
+            if matching_search_terms_for_target:
+                highest_matching_search_term, score, target = max(matching_search_terms_for_target, key=lambda x: x[1])
+                secondary_target_matches.append((highest_matching_search_term, score))
+                search_terms_copy.remove(highest_matching_search_term)
+                secondary_targets.remove(target)
+            else:
+                # no matching_search_term, all targets can be disregarded
+                secondary_targets = []
+    # calc score
+    primary_target_match_length = 0
+    for word, score in primary_target_matches:
+        primary_target_match_length += len(word) * score  # score is a number from 0-1 that measures how closely the user's search term matched the target word
+    primary_target_miss_length = sum([len(i) for i in primary_target_misses])
+    primary_target_score = 100 * primary_target_match_length / (primary_target_match_length + primary_target_miss_length)
+    if matched_reviewer_by_mention:
+        primary_target_score = primary_target_score / 2 # change max score from primary to 50 instead of 100
+        primary_target_score += 50
+    secondary_target_score = 0
+    for word, score in secondary_target_matches:
+        secondary_target_score += len(word) * score * 5 # up to 5 points per letter of matching words. "i hated this movie" = 15 chars = 75 points.
+    for word in search_terms_copy:
+        # remaining unmatched search terms from user input
+        secondary_target_score -= len(word) * 5
+    if secondary_target_score < 0:
+        secondary_target_score = 0      
+    return primary_target_score + secondary_target_score
+    
+def _closest_search_term(target, search_terms, term_scores, threshold=0.5):
+    """same result as find_closest_match_and_score(target, search_terms) but with the scores looked up, not computed"""
+    if len(target) == 0:
+        return None, 0
+    best_term, best_score = None, None
+    for term in search_terms:
+        score = term_scores[term].get(target, 0)
+        if score > threshold and (best_term is None or score > best_score):
+            best_term, best_score = term, score
+    return best_term, best_score
+
 async def send_goodly(ctx, message):
     """standard way of sending a MESSAGE to the stupid user"""
     try:
-        messages = await chunk(message)
+        # chunks are cut lazily so the first one goes out before the rest of a long message is split
+        for message in iter_chunks(message):
+            await ctx.send("```ansi\n" + message + "```")
     except ValueError as e:
         return await ctx.send(f"somehow the basic way i am supposed to send messages broke that is very bad.\n{e}")
-    for message in messages:
-        await ctx.send("```ansi\n" + message + "```")
         
-async def chunk(message, max_length=1900):
+async def chunk(message, max_length=DISCORD_CHUNK_LENGTH):
     """returns list of strings
     each chunk is either max_length or was separated by a newline in the original message"""
-    chunks = []
-    while message:
-        chunk = ""
-        newline_pos = None
-        while (len(chunk) <= max_length) and message:
-            character = message[0]
-            message = message[1:]
-            chunk += character
-            if character == "\n":
-                newline_pos = len(chunk)
-        if newline_pos and message:
-            extra = chunk[newline_pos:]
-            message = extra + message
-            chunk = chunk[:newline_pos - 1]
-        chunks.append(chunk)
-    return chunks
+    return list(iter_chunks(message, max_length))
     
 
 async def parse_user_input_for_number_or_pagination(user_input):
@@ -1546,29 +1611,19 @@ async def parse_user_input_for_mention(db, ctx, user_input):
 async def name_or_mention_to_id(db, ctx, name_or_mention):
     """when provided with a user's name or an @, find the user id.
        good for funcs where user is expected to supply a member name as an argument"""
-    guild_user_info = [[member.id, member.name] for member in ctx.message.guild.members]
+    members = member_directory.get(ctx.message.guild)
     user_id = None
     user_id = await id_from_mention(name_or_mention)
     if user_id:
-        guild_user_ids = [i[0] for i in guild_user_info]
-        if user_id not in guild_user_ids:
+        if user_id not in members:
             return None # send error through ctx here or let the func that calls this do it?
     else:
-        names = [i[1] for i in guild_user_info]
-        matched_name, _ = find_closest_match_and_score(search_term=name_or_mention, bank=names)
-        if matched_name:
-            for i in guild_user_info:
-                if i[1] == matched_name:
-                    user_id = i[0]
-        else:
+        user_id, _ = members.best_match(name_or_mention)
+        if not user_id:
             return None
     try:
-        rows = await db.fetch("SELECT id FROM users WHERE id = $1", user_id)
-        if rows:
-            return user_id
-        else:
-            await db.execute("INSERT INTO users (id) values ($1)", user_id)
-            return user_id
+        await ensure_ids(db, user_id=user_id)
+        return user_id
     except asyncpg.exceptions.PostgresError as e:
         await ctx.send("Ruh roh database error")
         print(f"Database error: {e}")
@@ -1645,6 +1700,39 @@ async def paginate(input_list, results_per_page, page_num):
     start = (page_num-1) * results_per_page
     end = start + results_per_page
     return input_list[start:end]
+
+async def fetch_page(db, sql, args, order_by, results_per_page, page_num):
+    """sql version of paginate(), so only one page of rows ever leaves the db.
+    sql is the full query without ORDER BY. order_by is a list of "column ASC/DESC" terms using sql's output column names.
+    the last term has to be unique (an id), otherwise rows that tie can land on two pages or on none.
+    negative results_per_page flips every term, same as paginate() reversing the list.
+    a page past the end gives the last page like paginate() does.
+    returns (rows, total_count)"""
+    max_results_per_page = 100
+    if page_num < 1:
+        page_num = 1
+    reverse = results_per_page < 0
+    results_per_page = min(abs(results_per_page), max_results_per_page)
+    order = ", ".join(_flip_order(term) if reverse else term for term in order_by)
+    n = len(args)
+    page_sql = f"""SELECT *, COUNT(*) OVER() AS total_count FROM ({sql}) AS page
+                   ORDER BY {order} LIMIT ${n + 1} OFFSET ${n + 2}"""
+    rows = await db.fetch(page_sql, *args, results_per_page, (page_num - 1) * results_per_page)
+    if rows:
+        return rows, rows[0]['total_count']
+    if page_num == 1:
+        return [], 0
+    # past the last page: the window count isn't there without rows, so count separately and fetch the last page
+    total_count = await db.fetchval(f"SELECT COUNT(*) FROM ({sql}) AS page", *args)
+    if not total_count:
+        return [], 0
+    last_page_num = math.ceil(total_count / results_per_page)
+    rows = await db.fetch(page_sql, *args, results_per_page, (last_page_num - 1) * results_per_page)
+    return rows, total_count
+    
+def _flip_order(term):
+    column, _, direction = term.rpartition(" ")
+    return f"{column} {'ASC' if direction.upper() == 'DESC' else 'DESC'}"
     
 async def id_from_mention(text):
     pattern = "<@!?([0-9]+)>"
@@ -1657,20 +1745,19 @@ async def id_from_mention(text):
         
 async def user_id_to_username(ctx, user_id):
     """finds a user's username given their discord id"""
-    guild_user_info = [[member.id, member.name] for member in ctx.message.guild.members]
-    for i in guild_user_info:
-        if i[0] == user_id:
-            return i[1]
-    return None
+    return member_directory.get(ctx.message.guild).name(user_id)
+    
+async def user_ids_to_usernames(ctx, user_ids):
+    """batch version of user_id_to_username for building lists.
+    returns {user_id: username}, falling back to str(user_id) for anyone no longer in the guild"""
+    members = member_directory.get(ctx.message.guild)
+    return {user_id: members.name(user_id) or str(user_id) for user_id in set(user_ids)}
         
 async def find_exact_movie(db, guild_id, movie_title):
     """finds an exact movie (case insensitive), as opposed to the best match technique in find_all()"""
     try:
-        rows = await db.fetch("SELECT * FROM movies WHERE guild_id=$1 AND title=$2", guild_id, movie_title)
-        if rows:
-            return rows[0]
-        else:
-            return None
+        movies = await movie_catalogue.get(db, guild_id)
+        return movies.find_exact(movie_title)
     except asyncpg.exceptions.PostgresError as e:
         print(f"Database error: {e}")
         return None
@@ -1914,8 +2001,30 @@ async def on_close():
     if getattr(bot, "db_pool", None):
         await bot.db_pool.close()
 
+@bot.event
+async def on_member_join(member):
+    member_directory.member_joined(member)
+
+@bot.event
+async def on_member_update(before, after):
+    member_directory.member_updated(before, after)
+
+@bot.event
+async def on_member_remove(member):
+    member_directory.member_removed(member)
+
+@bot.event
+async def on_user_update(before, after):
+    member_directory.user_updated(before, after)
+
 @bot.event
 async def on_ready():
+    # member events can be missed while disconnected, so rebuild names from the fresh member cache
+    member_directory.invalidate()
     print(f"Logged in as {bot.user} (reconnected ok)")
-    
-bot.run(bot_token)
\ No newline at end of file
+
+if __name__ == "__main__":
+    # plot workers are spawned, and spawn re-imports this file in every worker as __mp_main__.
+    # anything with side effects (db setup, logging in) has to stay under here so only the real bot runs it
+    make_db() # update db tables. creates & closes its own conn
+    bot.run(bot_token)
@@ -1,38 +1,55 @@
-import asyncpg 
+import asyncpg
+
+# ids already known to be in the users/guilds tables, so the steady state needs no db round trip.
+# rows in those tables are never deleted by the bot so the sets never go stale
+_known_user_ids = set()
+_known_guild_ids = set()
 
 # helper func for asyncpg
 async def fetch_as_dict(connection, query, *args):
     rows = await connection.fetch(query, *args)
     return [dict(row) for row in rows]
 
-async def get_user_id(ctx, db_pool):
-    """get user id from ctx. add it to db if it doesn't exist"""
+async def ensure_ids(db_pool, user_id=None, guild_id=None):
+    """make sure user_id and/or guild_id exist in the db, in at most one statement. raises on db errors"""
+    new_user = user_id is not None and user_id not in _known_user_ids
+    new_guild = guild_id is not None and guild_id not in _known_guild_ids
+    if not new_user and not new_guild:
+        return
+    if new_user and new_guild:
+        await db_pool.execute("""
+            WITH new_user AS (INSERT INTO users (id) VALUES ($1) ON CONFLICT DO NOTHING)
+            INSERT INTO guilds (id) VALUES ($2) ON CONFLICT DO NOTHING""",
+            user_id, guild_id
+        )
+    elif new_user:
+        await db_pool.execute("INSERT INTO users (id) VALUES ($1) ON CONFLICT DO NOTHING", user_id)
+    else:
+        await db_pool.execute("INSERT INTO guilds (id) VALUES ($1) ON CONFLICT DO NOTHING", guild_id)
+    if new_user:
+        _known_user_ids.add(user_id)
+    if new_guild:
+        _known_guild_ids.add(guild_id)
+
+async def ensure_user_and_guild(ctx, db_pool):
+    """get (user id, guild id) from ctx. adds either to db if it doesn't exist. (None, None) on db error"""
     user_id = ctx.message.author.id
+    guild_id = ctx.message.guild.id
     try:
-        async with db_pool.acquire() as connection:
-            rows = await fetch_as_dict(connection, "SELECT id FROM users WHERE id = $1", user_id)
-            if rows:
-                return user_id
-            else:
-                await connection.execute("INSERT INTO users (id) values ($1)", user_id)
-                return user_id
+        await ensure_ids(db_pool, user_id=user_id, guild_id=guild_id)
+        return user_id, guild_id
     except asyncpg.exceptions.PostgresError as e:
         await ctx.send("Ruh roh database error")
         print(f"Database error: {e}")
-        return None
-        
+        return None, None
+
 async def get_guild_id(ctx, db_pool):
     """get guild id from ctx. add it to db if it doesn't exist"""
     guild_id = ctx.message.guild.id
     try:
-        async with db_pool.acquire() as connection:
-            rows = await fetch_as_dict(connection, "SELECT id FROM guilds WHERE id=$1", guild_id)
-            if rows:
-                return guild_id
-            else:
-                await connection.execute("INSERT INTO guilds (id) values ($1)", guild_id)
-                return guild_id
+        await ensure_ids(db_pool, guild_id=guild_id)
+        return guild_id
     except asyncpg.exceptions.PostgresError as e:
         await ctx.send("Ruh roh database error")
         print(f"Database error: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -1,17 +1,25 @@
 import asyncio
+import os
 import time
 import io
 import base64
+import random
+import struct
+import threading
 import subprocess
 from typing import Optional, Dict, Tuple, List, Deque, Union
-from collections import deque, Counter
+from collections import deque, Counter, OrderedDict
 import unicodedata
 import aiohttp
 import discord
 from discord.ext import commands
+from discord.oggparse import OggStream, OggError
+from yarl import URL
 from config import google_narrate_key
-from bot_helpers import get_user_id, get_guild_id
+from bot_helpers import ensure_user_and_guild
 from db_mixin import DbMixin
+from tts_disk_cache import DiskTTSCache, clip_key
+from phrase_sketch import PhraseTracker
 import re
 
 
@@ -20,18 +28,55 @@ import re
 # ==========================
 MAX_CHARS_PER_CHUNK = 180                  # small chunks → faster time-to-first-audio
 NARRATE_WORKERS = 4                        # will reduce lag if multiple guilds are narrating
-CACHE_MAX_ITEMS = 512                      # in-memory audio cache entries
+GUILD_NARRATE_QUEUE_DEPTH = 25             # per-guild pending messages; past this the oldest is dropped
+COALESCE_WINDOW_SECS = 0.4                 # merge a user's messages sent this close together into one TTS request; 0 = off
+CACHE_MAX_BYTES = 24 * 1024 * 1024         # in-memory audio cache budget (clips vary a lot in size)
+DISK_CACHE_DIR = "tts_cache"               # persistent audio cache under the in-memory one; None to turn it off
+DISK_CACHE_MAX_BYTES = 512 * 1024 * 1024
+DISK_CACHE_MAX_AGE_SECS = 90 * 24 * 3600   # drop clips nobody has asked for in this long
 PLAYBACK_IDLE_DISCONNECT_SECS = 3600       # leave VC when idle
 DEFAULT_VOICE = "en-US-Wavenet-D"          # must be a full canonical name
 DEFAULT_LANG = "en-US"
 DEFAULT_RATE = 1.0                         # 0.25–4.0 (classic voices only)
 FFMPEG_BIN = "ffmpeg"
+OPUS_PASSTHROUGH = True                    # play Google's OGG/Opus packets as-is instead of ffmpeg decode + re-encode
 PLAY_TIMEOUT = 120                          # max seconds per clip
+PLAYBACK_MAX_BYTES = 4 * 1024 * 1024       # per guild: audio waiting to be played
+PLAYBACK_MAX_SECS = 180                    # per guild: seconds of audio waiting to be played
+PLAYBACK_OVERFLOW = "drop_oldest"          # what to throw away past those: "drop_oldest", "coalesce" or "skip_to_latest"
+DECODER_READ_TIMEOUT = 5                   # secs to wait on the warm decoder for PCM before respawning it
 
 # Global TTS concurrency (simple protection for many guilds)
 GLOBAL_TTS_CONCURRENCY = 10
-
-GOOGLE_TTS_ENDPOINT = "https://texttospeech.googleapis.com/v1/text:synthesize?key={api_key}"
+PIPELINED_SYNTH = True                     # synth all chunks of a message at once, play them in order as they land
+TTS_KEEPALIVE_SECS = 60                    # keep idle connections to google open this long between messages
+TTS_DNS_CACHE_SECS = 300
+TTS_TIMING_SAMPLES = 200                   # recent requests kept for the connect / ttfb / body breakdown
+TTS_TIMEOUT_SECS = 8                       # per attempt
+TTS_MAX_RETRIES = 2                        # extra attempts on 429 / 5xx / connection errors
+TTS_RETRY_BASE_SECS = 0.25                 # backoff before retry n is uniform in [0, base * 2**n]
+TTS_RETRY_BUDGET = 0.1                     # retries allowed per request made in the last minute, so retries can't multiply an outage...
+TTS_RETRY_FLOOR = 5                        # ...but this many per minute are always allowed, so a quiet bot still retries
+BREAKER_WINDOW = 20                        # recent requests the breaker judges google by
+BREAKER_MIN_CALLS = 10                     # don't judge on a handful of requests
+BREAKER_ERROR_RATE = 0.5                   # trip when this share of the window failed...
+BREAKER_SLOW_SECS = 5
+BREAKER_SLOW_RATE = 0.5                    # ...or took longer than BREAKER_SLOW_SECS
+BREAKER_COOLDOWN_SECS = 15                 # open this long before one probe request; doubles on each failed probe
+BREAKER_MAX_COOLDOWN_SECS = 120
+NARRATE_STALE_SECS = 30                    # queued text older than this isn't worth saying anymore
+
+# Speculative pre-synthesis of phrases people keep saying ("gg", "lol", ...)
+WARM_MAX_CHARS = 40                        # only short chunks are counted as phrases
+WARM_TOP_K = 50                            # how many of the most frequent phrases to keep synthesized
+WARM_MIN_COUNT = 3                         # said at least this many times (decayed) before it's worth an API call
+WARM_INTERVAL_SECS = 300
+WARM_IDLE_SECS = 30                        # only warm when nothing has been narrated anywhere for this long
+WARM_API_BUDGET_PER_DAY = 200              # max TTS requests the warmer may spend in any 24h
+WARM_DECAY_SECS = 6 * 3600                 # halve all phrase counts this often so old favourites fade
+
+# set GOOGLE_TTS_ENDPOINT in the environment to point at something else, e.g. fake_tts_server.py for load tests
+GOOGLE_TTS_ENDPOINT = os.getenv("GOOGLE_TTS_ENDPOINT") or "https://texttospeech.googleapis.com/v1/text:synthesize?key={api_key}"
 
 
 # ==========================
@@ -108,6 +153,396 @@ def _short_voice_name(voice_name: str) -> str:
     parts = voice_name.split("-", 2)
     return parts[2] if len(parts) >= 3 else voice_name
 
+# frame duration (ms) for each Opus TOC config number, RFC 6716 section 3.1
+_OPUS_FRAME_MS = [10, 20, 40, 60] * 3 + [10, 20] * 2 + [2.5, 5, 10, 20] * 4
+
+def _opus_packet_ms(packet: bytes) -> float:
+    toc = packet[0]
+    frame_count = toc & 0x3
+    if frame_count == 0:
+        frames = 1
+    elif frame_count in (1, 2):
+        frames = 2
+    else:
+        frames = packet[1] & 0x3F if len(packet) > 1 else 0
+    return frames * _OPUS_FRAME_MS[toc >> 3]
+
+def _demux_ogg_opus(audio: bytes) -> Optional[Tuple[bytes, List[bytes]]]:
+    """(OpusHead packet, audio packets) of an OGG/Opus file, or None if it isn't one we can handle (>2 channels etc)."""
+    if not audio.startswith(b"OggS"):
+        return None
+    try:
+        packets = list(OggStream(io.BytesIO(audio)).iter_packets())
+    except OggError:
+        return None
+    if len(packets) < 2 or not packets[0].startswith(b"OpusHead") or not packets[1].startswith(b"OpusTags"):
+        return None
+    head = packets[0]
+    channels = head[9] if len(head) > 9 else 0
+    if channels not in (1, 2):
+        return None
+    frames = [p for p in packets[2:] if p]
+    if not frames:
+        return None
+    return head, frames
+
+def ogg_opus_packets(audio: bytes) -> Optional[List[bytes]]:
+    """
+    Demux an OGG/Opus file into its audio packets, ready to hand to discord as-is.
+    None if it isn't something discord can take directly (not Ogg/Opus, more than
+    2 channels, or packets that aren't the 20 ms discord's player paces at) so the
+    caller can fall back to ffmpeg.
+    """
+    demuxed = _demux_ogg_opus(audio)
+    if not demuxed:
+        return None
+    _, frames = demuxed
+    if any(_opus_packet_ms(p) != 20 for p in frames):
+        return None
+    return frames
+
+
+class OpusPacketSource(discord.AudioSource):
+    """Already-encoded 20 ms Opus packets, sent straight to the voice client (no ffmpeg, no re-encode)."""
+    def __init__(self, packets: List[bytes]):
+        self._packets = iter(packets)
+
+    def read(self) -> bytes:
+        return next(self._packets, b"")
+
+    def is_opus(self) -> bool:
+        return True
+
+
+def clip_duration_secs(audio: bytes) -> float:
+    """
+    Length of a clip without demuxing it: for OGG/Opus it's the last page's granule
+    position (48 kHz samples) minus the pre-skip. Anything else is guessed from its
+    size at Google's usual ~32 kbps.
+    """
+    if audio.startswith(b"OggS"):
+        last_page = audio.rfind(b"OggS")
+        head = audio.find(b"OpusHead", 0, 512)
+        if head != -1 and last_page + 14 <= len(audio) and head + 12 <= len(audio):
+            granule = struct.unpack_from("<q", audio, last_page + 6)[0]
+            pre_skip = struct.unpack_from("<H", audio, head + 10)[0]
+            if granule > pre_skip:
+                return (granule - pre_skip) / 48000
+    return len(audio) / 4000
+
+
+# ==========================
+# Playback buffer
+# ==========================
+class PlaybackBuffer:
+    """
+    A guild's clips waiting to be played, bounded by total bytes and total seconds of audio
+    instead of clip count. put() never blocks; once a new clip would go over budget,
+    `policy` decides what makes room:
+      - "drop_oldest": drop from the front of the line
+      - "coalesce": thin out whoever holds the most buffered audio, dropping their messages
+        between the one they're on and their newest
+      - "skip_to_latest": drop every speaker's older messages, keeping only each speaker's newest
+    and anything still over budget after that is dropped oldest first.
+    A single clip over budget is still played if nothing else is waiting.
+    """
+    POLICIES = ("drop_oldest", "coalesce", "skip_to_latest")
+
+    def __init__(self, max_bytes: int = PLAYBACK_MAX_BYTES, max_secs: float = PLAYBACK_MAX_SECS,
+                 policy: str = PLAYBACK_OVERFLOW):
+        if policy not in self.POLICIES:
+            raise ValueError(f"unknown playback overflow policy {policy!r}")
+        self.max_bytes = max_bytes
+        self.max_secs = max_secs
+        self.policy = policy
+        # (speaker_id, message_key, audio, seconds), oldest first. message_key groups the chunks of one message
+        self._clips: Deque[Tuple[int, object, bytes, float]] = deque()
+        self._ready = asyncio.Event()
+        self.bytes = 0
+        self.secs = 0.0
+        self.dropped = 0
+        self.dropped_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._clips)
+
+    def put(self, audio: bytes, speaker_id: int = 0, message_key: object = None) -> None:
+        secs = clip_duration_secs(audio)
+        if self._clips and not self._fits(len(audio), secs):
+            self._make_room(len(audio), secs, speaker_id, message_key)
+        self._clips.append((speaker_id, message_key, audio, secs))
+        self.bytes += len(audio)
+        self.secs += secs
+        self._ready.set()
+
+    async def get(self) -> bytes:
+        while not self._clips:
+            self._ready.clear()
+            await self._ready.wait()
+        _, _, audio, secs = self._clips.popleft()
+        self.bytes -= len(audio)
+        self.secs -= secs
+        return audio
+
+    def clear(self) -> None:
+        self._clips.clear()
+        self.bytes = 0
+        self.secs = 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "clips": len(self._clips),
+            "bytes": self.bytes,
+            "secs": self.secs,
+            "dropped": self.dropped,
+            "dropped_bytes": self.dropped_bytes,
+        }
+
+    def _fits(self, nbytes: int, secs: float) -> bool:
+        return self.bytes + nbytes <= self.max_bytes and self.secs + secs <= self.max_secs
+
+    def _make_room(self, nbytes: int, secs: float, speaker_id: int, message_key: object) -> None:
+        if self.policy == "skip_to_latest":
+            # the incoming clip belongs to its speaker's newest message
+            latest = {spk: key for spk, key, _, _ in self._clips}
+            latest[speaker_id] = message_key
+            self._drop_where(lambda c: c[1] != latest[c[0]])
+        elif self.policy == "coalesce":
+            while not self._fits(nbytes, secs):
+                held: Dict[int, int] = {}
+                for spk, _, audio, _ in self._clips:
+                    held[spk] = held.get(spk, 0) + len(audio)
+                held[speaker_id] = held.get(speaker_id, 0) + nbytes
+                victim = max(held, key=held.get)
+                keys = list(dict.fromkeys(c[1] for c in self._clips if c[0] == victim))
+                if len(keys) < 3:
+                    break  # nothing between their current and newest message left to drop
+                middle = keys[1]
+                self._drop_where(lambda c: c[0] == victim and c[1] == middle)
+        while self._clips and not self._fits(nbytes, secs):
+            self._drop(self._clips.popleft())
+
+    def _drop_where(self, predicate) -> None:
+        kept = deque()
+        for clip in self._clips:
+            if predicate(clip):
+                self._drop(clip)
+            else:
+                kept.append(clip)
+        self._clips = kept
+
+    def _drop(self, clip: Tuple[int, object, bytes, float]) -> None:
+        self.bytes -= len(clip[2])
+        self.secs -= clip[3]
+        self.dropped += 1
+        self.dropped_bytes += len(clip[2])
+
+
+# ==========================
+# Warm ffmpeg decoder
+# ==========================
+def _ogg_crc_table() -> List[int]:
+    table = []
+    for i in range(256):
+        r = i << 24
+        for _ in range(8):
+            r = ((r << 1) ^ 0x04C11DB7) if r & 0x80000000 else (r << 1)
+        table.append(r & 0xFFFFFFFF)
+    return table
+
+_OGG_CRC_TABLE = _ogg_crc_table()
+
+def _ogg_crc(data: bytes) -> int:
+    crc = 0
+    for b in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC_TABLE[(crc >> 24) ^ b]
+    return crc
+
+def _ogg_page(packet: bytes, serial: int, seq: int, granule: int, flag: int = 0) -> bytes:
+    """one packet -> one Ogg page (RFC 3533)"""
+    lacing = b"\xff" * (len(packet) // 255) + bytes([len(packet) % 255])
+    header = b"OggS" + struct.pack("<BBqIIIB", 0, flag, granule, serial, seq, 0, len(lacing)) + lacing
+    crc = _ogg_crc(header + packet)
+    return header[:22] + struct.pack("<I", crc) + header[26:] + packet
+
+
+class PCMDecoder:
+    """
+    One long-lived ffmpeg per guild for clips that can't be passed through as Opus.
+
+    Instead of a process per clip, every clip's Opus packets are re-muxed onto the end of
+    ONE continuous Ogg stream written to ffmpeg's stdin, and ffmpeg streams 48k stereo PCM
+    back out. Opus packet durations are known from their TOC byte, so we know exactly how
+    many PCM bytes each clip turns into and can cut the output stream back into clips.
+
+    Health: a dead process, a write error or a read timeout marks it broken and the next
+    clip respawns it (a fresh stream, so nothing stale carries over). A clip with a
+    different channel count also starts a fresh stream since the OpusHead is per stream.
+    """
+    BYTES_PER_MS = 48 * 2 * 2  # 48 kHz, stereo, s16le
+    # ffmpeg holds back the last <first packet's duration> ms of the stream until more arrives
+    # (its audio frame size gets fixed by the first frame it decodes), so every clip is followed
+    # by that much Opus silence to push its real audio out. The held silence then comes out at
+    # the front of the next clip's PCM, so it's counted there
+    SILENCE = b"\xf8\xff\xfe"  # 20 ms
+
+    def __init__(self, executable: str = FFMPEG_BIN):
+        self.executable = executable
+        self.spawns = 0
+        self._proc: Optional[subprocess.Popen] = None
+        self._channels = None
+        self._serial = 0
+        self._seq = 0
+        self._granule = 0
+        self._hold_ms = 20
+        self._held_ms = 0
+        self._buf = bytearray()
+        self._cond = threading.Condition()
+        self._eof = True
+        self._broken = False
+        self._write_lock = threading.Lock()
+
+    def healthy(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None and not self._broken
+
+    def mark_broken(self, reason: str) -> None:
+        if not self._broken:
+            print(f"[narrate] decoder broken ({reason}), will respawn")
+        self._broken = True
+
+    def feed(self, head: bytes, frames: List[bytes]) -> int:
+        """Write one clip (blocking, run it in a thread). Returns how many PCM bytes it will produce."""
+        with self._write_lock:
+            channels = head[9]
+            nbytes = int(sum(_opus_packet_ms(f) for f in frames) * self.BYTES_PER_MS)
+            if not self.healthy() or channels != self._channels:
+                self._spawn(head, _opus_packet_ms(frames[0]))
+                nbytes -= struct.unpack_from("<H", head, 10)[0] * 4  # pre-skip is only dropped at stream start
+            nbytes += int(self._held_ms * self.BYTES_PER_MS)  # the previous clip's trailing silence
+            silence = [self.SILENCE] * int(-(-self._hold_ms // 20))
+            self._held_ms = self._hold_ms
+            pages = []
+            for f in frames + silence:
+                self._granule += int(_opus_packet_ms(f) * 48)
+                pages.append(_ogg_page(f, self._serial, self._seq, self._granule))
+                self._seq += 1
+            try:
+                self._proc.stdin.write(b"".join(pages))
+                self._proc.stdin.flush()
+            except (OSError, ValueError) as e:
+                self.mark_broken(f"write failed: {e}")
+                return 0
+            return max(nbytes, 0)
+
+    def read(self, n: int, timeout: float = DECODER_READ_TIMEOUT) -> bytes:
+        """Up to n bytes of PCM, blocking until they're there. Short only on timeout/eof (and then it's broken)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(self._buf) < n and not self._eof:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            data = bytes(self._buf[:n])
+            del self._buf[:n]
+        if len(data) < n:
+            self.mark_broken("timed out waiting for pcm" if not self._eof else "ffmpeg exited")
+        return data
+
+    def close(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc:
+            try:
+                proc.kill()
+            except Exception:
+                pass
+            try:
+                proc.wait(timeout=2)
+            except Exception:
+                pass
+
+    def _spawn(self, head: bytes, first_packet_ms: float) -> None:
+        self.close()
+        proc = subprocess.Popen(
+            [
+                self.executable, "-nostdin", "-hide_banner", "-loglevel", "error",
+                "-probesize", "32", "-analyzeduration", "0", "-fflags", "nobuffer",
+                "-f", "ogg", "-i", "pipe:0",
+                "-f", "s16le", "-ar", "48000", "-ac", "2", "-flush_packets", "1", "pipe:1",
+            ],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0,
+        )
+        with self._cond:
+            self._buf = bytearray()
+            self._eof = False
+        self._proc = proc
+        self._broken = False
+        self._channels = head[9]
+        self._serial = random.getrandbits(32)
+        self._seq = 0
+        self._granule = 0
+        self._hold_ms = first_packet_ms
+        self._held_ms = 0
+        self.spawns += 1
+        threading.Thread(target=self._pump, args=(proc,), name="narrate-decoder", daemon=True).start()
+        tags = b"OpusTags" + struct.pack("<I", 0) + struct.pack("<I", 0)
+        proc.stdin.write(_ogg_page(head, self._serial, 0, 0, flag=0x02) + _ogg_page(tags, self._serial, 1, 0))
+        self._seq = 2
+
+    def _pump(self, proc: subprocess.Popen) -> None:
+        # reader thread: keeps ffmpeg's stdout drained into _buf so it never stalls on a full pipe
+        while True:
+            try:
+                chunk = proc.stdout.read(65536)
+            except Exception:
+                chunk = b""
+            with self._cond:
+                if proc is not self._proc:
+                    return  # respawned; whatever this old process says no longer matters
+                if not chunk:
+                    self._eof = True
+                    self._cond.notify_all()
+                    return
+                self._buf += chunk
+                self._cond.notify_all()
+
+
+class DecodedClipSource(discord.AudioSource):
+    """One clip's worth of PCM out of a guild's PCMDecoder, in 20 ms frames."""
+    FRAME_BYTES = discord.opus.Encoder.FRAME_SIZE
+
+    def __init__(self, decoder: PCMDecoder, nbytes: int):
+        self.decoder = decoder
+        self.remaining = nbytes
+        self._cleanup_lock = threading.Lock()
+
+    def read(self) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        n = min(self.FRAME_BYTES, self.remaining)
+        data = self.decoder.read(n)
+        if len(data) < n:
+            self.remaining = 0
+            return b""
+        self.remaining -= n
+        return data + b"\x00" * (self.FRAME_BYTES - n)
+
+    def cleanup(self) -> None:
+        # stopped mid-clip: the rest of this clip is still coming out of ffmpeg, so eat it
+        # or the next clip would start with the tail of this one
+        # (discord's player thread and _play_one can both get here, hence the lock)
+        with self._cleanup_lock:
+            if self.remaining > 0 and self.decoder.healthy():
+                self.decoder.read(self.remaining)
+            self.remaining = 0
+
+
+def join_messages(first: str, second: str) -> str:
+    """Two narrated messages as one. A period between them keeps the pause TTS would have left between clips."""
+    if first[-1:] in ".!?,;:":
+        return f"{first} {second}"
+    return f"{first}. {second}"
+
 def chunk_text(text: str, limit: int = MAX_CHARS_PER_CHUNK) -> List[str]:
     text = text.strip()
     if len(text) <= limit:
@@ -132,33 +567,161 @@ class LRUCache:
     """
     Caches requests to & responses from the TTS service
     
-    Keys (Dict[Tuple[str, str, float):
+    Keys (Tuple[str, str, float]):
         f"{language}:{voice}:{text}", audio_encoding, speaking_rate
 
-    Values (Tuple[bytes, int]):
-        bytes = the compressed audio returned by Google TTS (e.g., OGG/Opus).
-        int = the last-access timestamp (ms) used for LRU eviction
+    Values (bytes):
+        the compressed audio returned by Google TTS (e.g., OGG/Opus).
+
+    Budgeted by total audio bytes, not entry count. The OrderedDict keeps
+    least-recently-used first, so get/put/evict are all O(1).
     """
-    def __init__(self, max_items: int):
-        self.max = max_items
-        self.store: Dict[Tuple[str, str, float], Tuple[bytes, int]] = {}
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.store: "OrderedDict[Tuple[str, str, float], bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.store)
 
     def get(self, key: Tuple[str, str, float]) -> Optional[bytes]:
-        val = self.store.get(key)
-        if not val:
+        audio = self.store.get(key)
+        if audio is None:
+            self.misses += 1
             return None
-        audio, _ = val
-        self.store[key] = (audio, _now_ms())
+        self.store.move_to_end(key)
+        self.hits += 1
         return audio
 
     def put(self, key: Tuple[str, str, float], audio: bytes) -> None:
-        if key in self.store:
-            self.store[key] = (audio, _now_ms())
+        if len(audio) > self.max_bytes:
+            return  # would evict everything and still not fit
+        old = self.store.pop(key, None)
+        if old is not None:
+            self.bytes -= len(old)
+        self.store[key] = audio
+        self.bytes += len(audio)
+        while self.bytes > self.max_bytes:
+            _, evicted = self.store.popitem(last=False)
+            self.bytes -= len(evicted)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "items": len(self.store),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# ==========================
+# Circuit breaker
+# ==========================
+class TTSUnavailable(RuntimeError):
+    """The circuit breaker is open, so nothing was sent."""
+
+class TTSTransientError(RuntimeError):
+    """Google was down, overloaded or unreachable (429 / 5xx / timeout), and retrying didn't help."""
+
+
+class CircuitBreaker:
+    """
+    closed: requests go through; the last `window` outcomes are tracked.
+    open: tripped because too many of those failed or were slow. Everything is refused
+          (fail fast) for `cooldown` secs.
+    half_open: after the cooldown exactly one probe request is let through. Success closes the
+          breaker, failure opens it again with the cooldown doubled (up to max_cooldown).
+
+    allow() hands out a ticket saying what a request was admitted as, and record() only counts
+    an outcome under that ticket: a slow request from before a trip finishing late is ignored,
+    it can't pass for the probe or land in the window of a later closed period.
+    """
+    def __init__(self, window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 error_rate: float = BREAKER_ERROR_RATE, slow_secs: float = BREAKER_SLOW_SECS,
+                 slow_rate: float = BREAKER_SLOW_RATE, cooldown: float = BREAKER_COOLDOWN_SECS,
+                 max_cooldown: float = BREAKER_MAX_COOLDOWN_SECS):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_secs = slow_secs
+        self.slow_rate = slow_rate
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window)  # (ok, slow)
+        self._probing = False
+
+    def allow(self) -> Optional[Tuple[str, int]]:
+        """a ticket ("closed" or "probe", trip count) to pass to record()/release(), or None if refused"""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.cooldown:
+                self.rejected += 1
+                return None
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                self.rejected += 1
+                return None
+            self._probing = True
+            return ("probe", self.trips)
+        return ("closed", self.trips)
+
+    def release(self, ticket: Tuple[str, int]) -> None:
+        """the admitted request never went out (e.g. cancelled while queued), so it says nothing either way"""
+        if ticket == ("probe", self.trips) and self.state == "half_open":
+            self._probing = False
+
+    def record(self, ticket: Tuple[str, int], ok: bool, secs: float) -> None:
+        slow = secs >= self.slow_secs
+        if ticket[1] != self.trips:
+            return  # admitted before the breaker last tripped
+        if ticket[0] == "probe":
+            if self.state != "half_open":
+                return
+            self._probing = False
+            if ok and not slow:
+                print("[narrate] tts circuit closed")
+                self.state = "closed"
+                self.cooldown = self.base_cooldown
+                self._outcomes.clear()
+            else:
+                self._trip(min(self.cooldown * 2, self.max_cooldown))
+            return
+        if self.state != "closed":
             return
-        if len(self.store) >= self.max:
-            oldest_key = min(self.store.items(), key=lambda kv: kv[1][1])[0]
-            self.store.pop(oldest_key, None)
-        self.store[key] = (audio, _now_ms())
+        self._outcomes.append((ok, slow))
+        if len(self._outcomes) >= self.min_calls:
+            n = len(self._outcomes)
+            errors = sum(1 for ok, _ in self._outcomes if not ok)
+            slows = sum(1 for _, slow in self._outcomes if slow)
+            if errors / n >= self.error_rate or slows / n >= self.slow_rate:
+                self._trip(self.base_cooldown)
+
+    def _trip(self, cooldown: float) -> None:
+        print(f"[narrate] tts circuit open for {cooldown:.0f}s")
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.cooldown = cooldown
+        self.trips += 1
+
+    def stats(self) -> Dict[str, float]:
+        n = len(self._outcomes)
+        return {
+            "state": self.state,
+            "error_rate": sum(1 for ok, _ in self._outcomes if not ok) / n if n else 0.0,
+            "slow_rate": sum(1 for _, slow in self._outcomes if slow) / n if n else 0.0,
+            "open_for": max(0.0, self.cooldown - (time.monotonic() - self.opened_at)) if self.state == "open" else 0.0,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
 
 
 # ==========================
@@ -168,24 +731,158 @@ class GoogleTTSProvider:
     """
     Google Cloud Text-to-Speech v1 REST.
     - Returns compressed (OGG_OPUS) bytes; we transcode to PCM via ffmpeg pipe.
-    - Uses a tiny in-memory cache and a global concurrency cap.
+    - Uses a small in-memory cache over a persistent disk cache, and a global concurrency cap.
     - Automatically adapts payload for Chirp/Journey voices (omit classic knobs).
     """
     def __init__(self, api_key: str):
         self.api_key = api_key
         self._session: Optional[aiohttp.ClientSession] = None
-        self._cache = LRUCache(CACHE_MAX_ITEMS)
+        self._cache = LRUCache(CACHE_MAX_BYTES)
+        self._disk_cache: Optional[DiskTTSCache] = None
+        if DISK_CACHE_DIR:
+            try:
+                self._disk_cache = DiskTTSCache(DISK_CACHE_DIR, DISK_CACHE_MAX_BYTES, DISK_CACHE_MAX_AGE_SECS)
+            except Exception as e:
+                print(f"[narrate] disk cache disabled: {e}")
         self._sem = asyncio.Semaphore(GLOBAL_TTS_CONCURRENCY)
+        # (connect, ttfb, body) seconds per request; connect is 0 when a pooled connection was reused
+        self._timings: Deque[Tuple[float, float, float]] = deque(maxlen=TTS_TIMING_SAMPLES)
+        self._inflight: Dict[Tuple[str, str, float], asyncio.Task] = {}  # cache key -> the one request fetching it
+        self.deduped = 0  # synth calls that joined an in-flight request instead of making their own
+        self.api_calls = 0
+        self.breaker = CircuitBreaker()
+        self.retries = 0
+        self._recent_requests: Deque[float] = deque()  # synth requests in the last minute, for the retry budget
+        self._recent_retries: Deque[float] = deque()
 
     async def start(self):
         if not self._session:
-            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+            # one pooled connection per allowed concurrent request, kept alive between messages,
+            # so a steady trickle of narration never pays for dns + tcp + tls again
+            connector = aiohttp.TCPConnector(
+                limit=GLOBAL_TTS_CONCURRENCY,
+                limit_per_host=GLOBAL_TTS_CONCURRENCY,
+                ttl_dns_cache=TTS_DNS_CACHE_SECS,
+                keepalive_timeout=TTS_KEEPALIVE_SECS,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=TTS_TIMEOUT_SECS, connect=5),
+                trace_configs=[self._trace_config()],
+            )
+
+    async def warm(self):
+        """open a connection to the tts host ahead of the first message (narrate on), so it doesn't pay the handshake"""
+        await self.start()
+        url = URL(GOOGLE_TTS_ENDPOINT.format(api_key=self.api_key)).origin()
+        try:
+            async with self._session.get(url) as resp:
+                await resp.read()  # any status is fine, the connection goes back in the pool
+        except Exception as e:
+            print(f"[narrate] tts warmup failed: {e}")
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        # each request passes a dict as trace_request_ctx; these stamp it as the request goes along
+        def stamp(name):
+            async def on_event(session, ctx, params):
+                if ctx.trace_request_ctx is not None:
+                    ctx.trace_request_ctx[name] = time.perf_counter()
+            return on_event
+        tc = aiohttp.TraceConfig()
+        tc.on_request_start.append(stamp("start"))
+        tc.on_connection_create_start.append(stamp("connect_start"))
+        tc.on_connection_create_end.append(stamp("connect_end"))
+        tc.on_request_end.append(stamp("headers"))
+        return tc
+
+    def http_stats(self) -> Optional[Dict[str, float]]:
+        """medians of the recent connect / ttfb / body times in ms, and how often a pooled connection was reused"""
+        if not self._timings:
+            return None
+        def median(values):
+            values = sorted(values)
+            return 1000 * values[len(values) // 2]
+        connects, ttfbs, bodies = zip(*self._timings)
+        return {
+            "requests": len(self._timings),
+            "connect_ms": median(connects),
+            "ttfb_ms": median(ttfbs),
+            "body_ms": median(bodies),
+            "reused": sum(1 for c in connects if c == 0) / len(connects),
+        }
+
+    def cache_stats(self) -> Dict[str, int]:
+        return self._cache.stats()
+
+    def disk_cache_stats(self) -> Optional[Dict[str, int]]:
+        return self._disk_cache.stats() if self._disk_cache else None
 
     async def close(self):
         if self._session:
             await self._session.close()
             self._session = None
 
+    def _retry_allowed(self) -> bool:
+        cutoff = time.monotonic() - 60
+        for recent in (self._recent_requests, self._recent_retries):
+            while recent and recent[0] < cutoff:
+                recent.popleft()
+        return len(self._recent_retries) < max(TTS_RETRY_FLOOR, TTS_RETRY_BUDGET * len(self._recent_requests))
+
+    async def _post(self, url: str, payload: dict) -> dict:
+        """
+        One request through the circuit breaker. Raises TTSUnavailable without sending anything
+        while it's open, TTSTransientError for 429 / 5xx / network trouble, RuntimeError for
+        anything else (e.g. a bad voice name, which says nothing about google's health).
+        """
+        ticket = self.breaker.allow()
+        if ticket is None:
+            raise TTSUnavailable("Google TTS is failing, circuit breaker open")
+        timing: Dict[str, float] = {}
+        healthy = False
+        started = None
+        try:
+            async with self._sem:
+                self.api_calls += 1
+                started = time.monotonic()
+                try:
+                    async with self._session.post(url, json=payload, trace_request_ctx=timing) as resp:
+                        if resp.status != 200:
+                            body = await resp.text()
+                            message = f"Google TTS error {resp.status}: {body[:500]}"
+                            if resp.status == 429 or resp.status >= 500:
+                                raise TTSTransientError(message)
+                            healthy = True
+                            raise RuntimeError(message)
+                        data = await resp.json()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    raise TTSTransientError(f"Google TTS request failed: {e!r}") from e
+                healthy = True
+                done = time.perf_counter()
+        finally:
+            if started is None:
+                self.breaker.release(ticket)
+            else:
+                self.breaker.record(ticket, healthy, time.monotonic() - started)
+        if "start" in timing and "headers" in timing:
+            connect = timing["connect_end"] - timing["connect_start"] if "connect_end" in timing else 0.0
+            self._timings.append((connect, timing["headers"] - timing["start"] - connect, done - timing["headers"]))
+        return data
+
+    @staticmethod
+    def _cache_key(text: str, voice_name: str, language_code: str, speaking_rate: float, audio_encoding: str):
+        """(memory cache key, whether it's a chirp/journey voice). those ignore speakingRate, so it's keyed as 1.0"""
+        vlow = (voice_name or "").lower()
+        is_chirp_or_journey = ("-chirp" in vlow) or ("-journey" in vlow)
+        eff_rate = 1.0 if is_chirp_or_journey else float(speaking_rate)
+        return (f"{language_code}:{voice_name}:{text}", audio_encoding, eff_rate), is_chirp_or_journey
+
+    def is_cached(self, text: str, voice_name: str, language_code: str, speaking_rate: float,
+                  audio_encoding: str = "OGG_OPUS") -> bool:
+        """in the memory cache right now (doesn't count as a hit or move it up the LRU)"""
+        key, _ = self._cache_key(text, voice_name, language_code, speaking_rate, audio_encoding)
+        return key in self._cache.store
+
     async def synth(
         self,
         text: str,
@@ -194,17 +891,53 @@ class GoogleTTSProvider:
         speaking_rate: float = DEFAULT_RATE,
         audio_encoding: str = "OGG_OPUS"
     ) -> bytes:
-        # Voice-family detection (string heuristic, no canonicalization)
-        vlow = (voice_name or "").lower()
-        is_chirp_or_journey = ("-chirp" in vlow) or ("-journey" in vlow)
-
         # Cache key should reflect whether we included rate or not
-        eff_rate = 1.0 if is_chirp_or_journey else float(speaking_rate)
-        key = (f"{language_code}:{voice_name}:{text}", audio_encoding, eff_rate)
+        key, is_chirp_or_journey = self._cache_key(text, voice_name, language_code, speaking_rate, audio_encoding)
+        eff_rate = key[2]
         cached = self._cache.get((key[0], key[1], key[2]))
         if cached is not None:
             return cached
 
+        # single-flight: if this exact clip is already being fetched (everyone typing "gg" at once),
+        # wait on that request instead of sending another. shielded so one caller giving up
+        # (e.g. a cancelled pipelined chunk) doesn't cancel it for the rest
+        task = self._inflight.get(key)
+        if task is not None:
+            self.deduped += 1
+            return await asyncio.shield(task)
+        task = asyncio.create_task(
+            self._synth_uncached(text, voice_name, language_code, audio_encoding, is_chirp_or_journey, eff_rate, key)
+        )
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._inflight_done(key, t))
+        return await asyncio.shield(task)
+
+    def _inflight_done(self, key: Tuple[str, str, float], task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark it retrieved, in case every caller gave up before it failed
+
+    async def _synth_uncached(
+        self,
+        text: str,
+        voice_name: str,
+        language_code: str,
+        audio_encoding: str,
+        is_chirp_or_journey: bool,
+        eff_rate: float,
+        key: Tuple[str, str, float],
+    ) -> bytes:
+        disk_key = clip_key(language_code, voice_name, text, audio_encoding, eff_rate)
+        if self._disk_cache:
+            try:
+                cached = await asyncio.to_thread(self._disk_cache.get, disk_key)
+            except Exception as e:
+                print(f"[narrate] disk cache read error: {e}")
+                cached = None
+            if cached is not None:
+                self._cache.put((key[0], key[1], key[2]), cached)
+                return cached
+
         if not self._session:
             await self.start()
 
@@ -220,18 +953,30 @@ class GoogleTTSProvider:
         }
 
         url = GOOGLE_TTS_ENDPOINT.format(api_key=self.api_key)
-        async with self._sem:
-            async with self._session.post(url, json=payload) as resp:
-                if resp.status != 200:
-                    body = await resp.text()
-                    raise RuntimeError(f"Google TTS error {resp.status}: {body[:500]}")
-                data = await resp.json()
+        self._recent_requests.append(time.monotonic())
+        attempt = 0
+        while True:
+            try:
+                data = await self._post(url, payload)
+                break
+            except TTSTransientError:
+                if attempt >= TTS_MAX_RETRIES or not self._retry_allowed() or self.breaker.state != "closed":
+                    raise
+            self._recent_retries.append(time.monotonic())
+            self.retries += 1
+            await asyncio.sleep(random.uniform(0, TTS_RETRY_BASE_SECS * 2 ** attempt))
+            attempt += 1
 
         audio_b64 = data.get("audioContent")
         if not audio_b64:
             raise RuntimeError("Google TTS response missing audioContent")
         audio_bytes = base64.b64decode(audio_b64)
         self._cache.put((key[0], key[1], key[2]), audio_bytes)
+        if self._disk_cache:
+            try:
+                await asyncio.to_thread(self._disk_cache.put, disk_key, audio_bytes)
+            except Exception as e:
+                print(f"[narrate] disk cache write error: {e}")
         return audio_bytes
 
 
@@ -251,7 +996,8 @@ class GuildVoiceSession():
         self.tts = tts
 
         self.voice_client: Optional[discord.VoiceClient] = None
-        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=200)
+        self.queue = PlaybackBuffer(PLAYBACK_MAX_BYTES, PLAYBACK_MAX_SECS, PLAYBACK_OVERFLOW)
+        self.decoder: Optional[PCMDecoder] = None  # warm ffmpeg for clips that can't go through as Opus
 
         self.player_task: Optional[asyncio.Task] = None
         self.idle_task: Optional[asyncio.Task] = None
@@ -259,8 +1005,8 @@ class GuildVoiceSession():
         self.last_activity = time.time()
 
     # ---------- enqueue ----------
-    async def enqueue(self, audio_bytes: bytes):
-        await self.queue.put(audio_bytes)
+    async def enqueue(self, audio_bytes: bytes, speaker_id: int = 0, message_key: object = None):
+        self.queue.put(audio_bytes, speaker_id, message_key)
         self.last_activity = time.time()
 
     # ---------- connection & lifecycle ----------
@@ -281,12 +1027,7 @@ class GuildVoiceSession():
                 self.voice_client.stop()
             except Exception:
                 pass
-        try:
-            while True:
-                self.queue.get_nowait()
-                self.queue.task_done()
-        except asyncio.QueueEmpty:
-            pass
+        self.queue.clear()
         self.last_activity = time.time()
 
     def _ensure_player(self):
@@ -304,10 +1045,7 @@ class GuildVoiceSession():
             while True:
                 audio_bytes = await self.queue.get()
                 try:
-                    try:
-                        await self._play_one(audio_bytes)
-                    finally:
-                        self.queue.task_done()
+                    await self._play_one(audio_bytes)
                     self.last_activity = time.time()
                 except asyncio.CancelledError:
                     raise
@@ -330,12 +1068,24 @@ class GuildVoiceSession():
             done.set()
 
         try:
-            source = discord.FFmpegPCMAudio(
-                io.BytesIO(audio_bytes),
-                pipe=True,
-                executable=FFMPEG_BIN,
-                before_options='-nostdin',   # avoid ffmpeg reading from stdin
-            )
+            packets = ogg_opus_packets(audio_bytes) if OPUS_PASSTHROUGH else None
+            demuxed = None if packets else _demux_ogg_opus(audio_bytes)
+            nbytes = 0
+            if demuxed:
+                if self.decoder is None:
+                    self.decoder = PCMDecoder()
+                nbytes = await asyncio.to_thread(self.decoder.feed, *demuxed)
+            if packets:
+                source = OpusPacketSource(packets)
+            elif nbytes:
+                source = DecodedClipSource(self.decoder, nbytes)
+            else:
+                source = discord.FFmpegPCMAudio(
+                    io.BytesIO(audio_bytes),
+                    pipe=True,
+                    executable=FFMPEG_BIN,
+                    before_options='-nostdin',   # avoid ffmpeg reading from stdin
+                )
             vc.play(source, after=_after)
 
             try:
@@ -356,7 +1106,10 @@ class GuildVoiceSession():
         finally:
             if source:
                 try:
-                    source.cleanup()
+                    if isinstance(source, DecodedClipSource):
+                        await asyncio.to_thread(source.cleanup)  # may have to drain the rest of the clip
+                    else:
+                        source.cleanup()
                 except Exception:
                     pass
                     
@@ -403,6 +1156,10 @@ class GuildVoiceSession():
         finally:
             self.voice_client = None
 
+            if self.decoder:
+                self.decoder.close()
+                self.decoder = None
+
             if self.player_task and not self.player_task.done():
                 self.player_task.cancel()
             self.player_task = None
@@ -411,12 +1168,90 @@ class GuildVoiceSession():
                 self.idle_task.cancel()
             self.idle_task = None
 
-            try:
-                while True:
-                    self.queue.get_nowait()
-                    self.queue.task_done()
-            except asyncio.QueueEmpty:
-                pass
+            self.queue.clear()
+
+# ==========================
+# Fair narration queue
+# ==========================
+class GuildFairQueue:
+    """
+    One bounded FIFO per guild, served round-robin across guilds.
+
+    - A guild is handed to at most one worker at a time (until task_done(guild_id)),
+      so its messages stay in order and a chatty guild can only ever occupy one worker.
+    - Each guild holds at most `depth` items; putting into a full one drops its oldest.
+    - Tracks per-guild depth, drops and how long items waited before a worker took them.
+    """
+    def __init__(self, depth: int = GUILD_NARRATE_QUEUE_DEPTH):
+        self.depth = depth
+        self._queues: Dict[int, Deque[Tuple[float, tuple]]] = {}
+        self._ready: Deque[int] = deque()  # guilds with items and no worker on them, in serve order
+        self._busy: set = set()
+        self._cond = asyncio.Condition()
+        self.stats: Dict[int, Dict[str, float]] = {}
+
+    def _guild_stats(self, guild_id: int) -> Dict[str, float]:
+        st = self.stats.get(guild_id)
+        if st is None:
+            st = self.stats[guild_id] = {"enqueued": 0, "dropped": 0, "served": 0, "wait_avg": 0.0, "wait_max": 0.0}
+        return st
+
+    def in_flight(self) -> int:
+        """guilds a worker is on right now"""
+        return len(self._busy)
+
+    def qsize(self, guild_id: Optional[int] = None) -> int:
+        if guild_id is not None:
+            return len(self._queues.get(guild_id, ()))
+        return sum(len(q) for q in self._queues.values())
+
+    async def put(self, guild_id: int, item: tuple) -> None:
+        q = self._queues.setdefault(guild_id, deque())
+        st = self._guild_stats(guild_id)
+        st["enqueued"] += 1
+        if len(q) >= self.depth:
+            q.popleft()
+            st["dropped"] += 1
+        q.append((time.monotonic(), item))
+        async with self._cond:
+            if guild_id not in self._busy and guild_id not in self._ready:
+                self._ready.append(guild_id)
+            self._cond.notify()
+
+    async def get(self) -> Tuple[int, tuple]:
+        """Next (guild_id, item). The caller must call task_done(guild_id) when finished with it."""
+        async with self._cond:
+            while True:
+                while not self._ready:
+                    await self._cond.wait()
+                guild_id = self._ready.popleft()
+                if self._queues.get(guild_id):
+                    break
+                self._queues.pop(guild_id, None)  # emptied by clear() while it waited its turn
+            self._busy.add(guild_id)
+        queued_at, item = self._queues[guild_id].popleft()
+        waited = time.monotonic() - queued_at
+        st = self._guild_stats(guild_id)
+        st["served"] += 1
+        st["wait_avg"] += (waited - st["wait_avg"]) * 0.2  # moving average
+        st["wait_max"] = max(st["wait_max"], waited)
+        return guild_id, item
+
+    async def task_done(self, guild_id: int) -> None:
+        async with self._cond:
+            self._busy.discard(guild_id)
+            if self._queues.get(guild_id):
+                self._ready.append(guild_id)  # back of the line behind every other waiting guild
+                self._cond.notify()
+            else:
+                self._queues.pop(guild_id, None)
+
+    def clear(self, guild_id: Optional[int] = None) -> None:
+        for gid in ([guild_id] if guild_id is not None else list(self._queues)):
+            q = self._queues.get(gid)
+            if q:
+                q.clear()
+
 
 # ==========================
 # Cog
@@ -438,13 +1273,28 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
         self.bot = bot
         self.tts = GoogleTTSProvider(google_narrate_key)
         self.guild_sessions: Dict[int, GuildVoiceSession] = {}
-        # guild_id, user_id, text_to_narrate, voice, language_code, rate, channel
-        self._narrate_queue: asyncio.Queue[tuple[int, int, str, str, str, float, int]] = asyncio.Queue()
-        self._guild_locks: Dict[int, asyncio.Lock] = {}
+        # per guild: (user_id, text_to_narrate, voice, language_code, rate, channel, received_at (monotonic))
+        self._narrate_queue = GuildFairQueue(GUILD_NARRATE_QUEUE_DEPTH)
+        # (guild_id, user_id) -> {"item": queue item being added to, "task": its flush timer}
+        self._coalescing: Dict[Tuple[int, int], dict] = {}
+        self._coalesced = Counter()  # guild_id -> messages merged into an earlier one
+        self._stale = Counter()  # guild_id -> queued messages dropped for waiting longer than NARRATE_STALE_SECS
+        self._outage_noticed: Dict[int, int] = {}  # guild_id -> breaker trip we last told them about
+        # write-through copy of narrate_prefs: guild_id -> {user_id: pref}, loaded a guild at a time.
+        # _enabled[guild_id] is who has it on there, so "nobody in this guild narrates" is one dict lookup
+        self._prefs: Dict[int, Dict[int, dict]] = {}
+        self._enabled: Dict[int, set] = {}
+        self._prefs_load_locks: Dict[int, asyncio.Lock] = {}
         self._workers: list[asyncio.Task] = [
             asyncio.create_task(self._narrate_worker(), name=f"narrate:{i}")
             for i in range(NARRATE_WORKERS)
         ]
+        # phrase frequencies per (voice, language, rate), for pre-synthesizing the common ones while idle
+        self._phrases = PhraseTracker(capacity=4 * WARM_TOP_K)
+        self._last_narration = time.monotonic()
+        self._warm_calls: Deque[float] = deque()  # when the warmer spent API calls, for the 24h budget
+        self._workers.append(asyncio.create_task(self._phrase_warmer(), name="narrate:warmer"))
+        self._bg_tasks: set = set()  # one-off tasks (tts warmup); the loop only holds tasks weakly
     def cog_unload(self):
         # Cancel background narrate workers immediately.
         for t in getattr(self, "_workers", []):
@@ -461,6 +1311,11 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
             except Exception:
                 pass
             self._workers = []
+            for pending in list(getattr(self, "_coalescing", {}).values()):
+                pending["task"].cancel()
+            self._coalescing = {}
+            for task in list(getattr(self, "_bg_tasks", ())):
+                task.cancel()
             try:
                 await asyncio.gather(
                     *[sess.teardown() for sess in list(self.guild_sessions.values())],
@@ -470,12 +1325,7 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
                 self.guild_sessions.clear()
             q = getattr(self, "_narrate_queue", None)
             if q is not None:
-                try:
-                    while True:
-                        q.get_nowait()
-                        q.task_done()
-                except asyncio.QueueEmpty:
-                    pass
+                q.clear()
             try:
                 await self.tts.close()
             except Exception:
@@ -486,11 +1336,17 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
         except Exception:
             asyncio.create_task(_cleanup())
 
-    def _guild_lock(self, guild_id: int) -> asyncio.Lock:
-        lock = self._guild_locks.get(guild_id)
-        if lock is None:
-            lock = self._guild_locks[guild_id] = asyncio.Lock()
-        return lock
+    def _background(self, coro, what: str) -> asyncio.Task:
+        """run coro without awaiting it, keeping a reference until it's done and logging it if it fails"""
+        task = asyncio.create_task(coro)
+        self._bg_tasks.add(task)
+
+        def done(t: asyncio.Task):
+            self._bg_tasks.discard(t)
+            if not t.cancelled() and t.exception() is not None:
+                print(f"[narrate] {what} failed: {t.exception()}")
+        task.add_done_callback(done)
+        return task
 
     def _get_session(self, guild_id: int) -> GuildVoiceSession:
         sess = self.guild_sessions.get(guild_id)
@@ -500,18 +1356,52 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
         return sess
 
     # ---------- DB Helpers ----------
+    def _narration_possible(self, guild_id: int) -> bool:
+        """False only when we know nobody in the guild has narration on. No awaits, no db."""
+        enabled = self._enabled.get(guild_id)
+        return enabled is None or bool(enabled)
+
+    async def _guild_prefs(self, guild_id: int) -> Dict[int, dict]:
+        prefs = self._prefs.get(guild_id)
+        if prefs is not None:
+            return prefs
+        lock = self._prefs_load_locks.setdefault(guild_id, asyncio.Lock())
+        async with lock:
+            prefs = self._prefs.get(guild_id)
+            if prefs is None:
+                rows = await self.db.fetch("""
+                    SELECT guild_id, user_id, text_channel_id, voice, rate, enabled
+                    FROM narrate_prefs
+                    WHERE guild_id=$1""",
+                    guild_id
+                )
+                prefs = {r["user_id"]: dict(r) for r in rows}
+                self._prefs[guild_id] = prefs
+                self._enabled[guild_id] = {uid for uid, p in prefs.items() if p["enabled"]}
+        return prefs
+
+    def _cache_pref(self, guild_id: int, user_id: int, **fields) -> None:
+        """apply a write that already went to the db. guilds that aren't loaded pick it up when they load"""
+        prefs = self._prefs.get(guild_id)
+        if prefs is None:
+            return
+        pref = prefs.get(user_id)
+        if pref is None:
+            if "text_channel_id" not in fields:
+                return  # an UPDATE that matched no row
+            pref = prefs[user_id] = {"guild_id": guild_id, "user_id": user_id, "voice": None, "rate": None, "enabled": True}
+        pref.update(fields)
+        if pref["enabled"]:
+            self._enabled[guild_id].add(user_id)
+        else:
+            self._enabled[guild_id].discard(user_id)
+
     async def _get_pref(self, guild_id: int, user_id: int) -> Optional[dict]:
-        row = await self.db.fetchrow("""
-            SELECT guild_id, user_id, text_channel_id, voice, rate, enabled
-            FROM narrate_prefs
-            WHERE guild_id=$1 AND user_id=$2""",
-            guild_id, user_id
-        )
-        return dict(row) if row else None
+        pref = (await self._guild_prefs(guild_id)).get(user_id)
+        return dict(pref) if pref else None
 
     async def _upsert_pref(self, ctx, text_channel_id, voice, rate, enabled):
-        guild_id = await get_guild_id(ctx, self.db)
-        user_id  = await get_user_id(ctx, self.db)
+        user_id, guild_id = await ensure_user_and_guild(ctx, self.db)
         if guild_id is None or user_id is None:
             return  # helpers already messaged on DB error
             
@@ -527,6 +1417,7 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
             """,
             guild_id, user_id, text_channel_id, voice, rate, enabled
         )
+        self._cache_pref(guild_id, user_id, text_channel_id=text_channel_id, voice=voice, rate=rate, enabled=enabled)
         
     async def _set_enabled(self, guild_id: int, user_id: int, enabled: bool) -> None:
         await self.db.execute("""
@@ -535,6 +1426,7 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
             WHERE guild_id=$1 AND user_id=$2""",
             guild_id, user_id, enabled
         )
+        self._cache_pref(guild_id, user_id, enabled=enabled)
     async def _set_all_prefs_disabled(self, guild_id: int) -> None:
         await self.db.execute("""
             UPDATE narrate_prefs
@@ -542,6 +1434,8 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
             WHERE guild_id=$1""",
         guild_id
         )
+        for user_id in list(self._enabled.get(guild_id, ())):
+            self._cache_pref(guild_id, user_id, enabled=False)
         
     async def _set_channel_pref(
         self,
@@ -572,21 +1466,6 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
         await self._upsert_pref(ctx, channel.id, voice, rate, enabled)
         return True
         
-    async def _any_enabled_in_channel(self, guild: discord.Guild, channel: discord.VoiceChannel) -> bool:
-        member_ids = [m.id for m in channel.members if not m.bot]
-        if not member_ids:
-            return False
-        row = await self.db.fetchrow(
-            """
-            SELECT 1
-            FROM narrate_prefs
-            WHERE guild_id=$1 AND enabled=TRUE AND user_id = ANY($2::bigint[])
-            LIMIT 1
-            """,
-            guild.id, member_ids
-        )
-        return row is not None
-
     async def _disable_enabled_users_not_in_channel(self, guild: discord.Guild, channel: discord.VoiceChannel) -> None:
         # Disable everyone with enabled=TRUE who is not currently in `channel`
         member_ids = {m.id for m in channel.members if not m.bot}
@@ -603,28 +1482,21 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
             """,
             guild.id, list(member_ids)
         )
+        for user_id in list(self._enabled.get(guild.id, ())):
+            if user_id not in member_ids:
+                self._cache_pref(guild.id, user_id, enabled=False)
 
     # ---------- Channel monitoring helpers ---------
     async def _enabled_user_ids(self, guild_id: int) -> List[int]:
-        rows = await self.db.fetch(
-            """SELECT user_id FROM narrate_prefs
-               WHERE guild_id=$1 AND enabled=TRUE""",
-            guild_id
-        )
-        return [r["user_id"] for r in rows]
+        await self._guild_prefs(guild_id)
+        return list(self._enabled[guild_id])
     
     async def _any_enabled_in_channel(self, guild_id: int, channel: discord.VoiceChannel) -> bool:
-        member_ids = [m.id for m in channel.members if not m.bot]
+        member_ids = {m.id for m in channel.members if not m.bot}
         if not member_ids:
             return False
-        row = await self.db.fetchrow("""
-            SELECT 1
-            FROM narrate_prefs
-            WHERE guild_id=$1 AND enabled=TRUE AND user_id = ANY($2::bigint[])
-            LIMIT 1""",
-            guild_id, member_ids
-        )
-        return row is not None
+        await self._guild_prefs(guild_id)
+        return not self._enabled[guild_id].isdisjoint(member_ids)
 
     async def _disconnect_if_no_enabled_in_channel(self, guild_id: int, channel: discord.VoiceChannel, session: "GuildVoiceSession") -> None:
         """Disconnect from voice if nobody in channel has it enabled.
@@ -662,7 +1534,7 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
         ch = ctx.channel  # could be a TextChannel or a Thread
         if not await self._set_channel_pref(ctx, ch, enable=True):
             return
-        await self.tts.start()
+        self._background(self.tts.warm(), "tts warmup")  # connect to google while we're joining voice
         session = self._get_session(ctx.guild.id)
         if ctx.author.voice and ctx.author.voice.channel:
             await session.ensure_connected(ctx.author.voice.channel)
@@ -777,6 +1649,47 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
                 rate_str = f"{DEFAULT_RATE if rate_val is None else rate_val}"
                 lines.append(f"- {username} | {v} | {rate_str}")
 
+        cache = self.tts.cache_stats()
+        lookups = cache["hits"] + cache["misses"]
+        hit_rate = f"{100 * cache['hits'] / lookups:.0f}%" if lookups else "n/a"
+        q = self._narrate_queue.stats.get(ctx.guild.id)
+        if q:
+            lines.append(
+                f"QUEUE: {self._narrate_queue.qsize(ctx.guild.id)} waiting, avg wait {q['wait_avg']:.1f}s, "
+                f"max wait {q['wait_max']:.1f}s, {int(q['dropped'])} dropped, {self._stale[ctx.guild.id]} stale, "
+                f"{self._coalesced[ctx.guild.id]} merged"
+            )
+        buf = session.queue.stats()
+        lines.append(
+            f"PLAYBACK BUFFER: {buf['clips']} clips, {buf['bytes'] // 1024} KB, {buf['secs']:.0f}s of audio, "
+            f"{buf['dropped']} dropped ({PLAYBACK_OVERFLOW})"
+        )
+        lines.append(
+            f"TTS CACHE: {cache['items']} clips, {cache['bytes'] // 1024} KB, {hit_rate} hit rate, {cache['evictions']} evicted, "
+            f"{self.tts.deduped} duplicate requests saved"
+        )
+        lines.append(
+            f"PHRASE WARMER: tracking {len(self._phrases.candidates)} phrases, "
+            f"{len(self._warm_calls)}/{WARM_API_BUDGET_PER_DAY} API calls used in the last 24h"
+        )
+        br = self.tts.breaker.stats()
+        state = f"open ({br['open_for']:.0f}s left)" if br["state"] == "open" else br["state"].replace("_", "-")
+        lines.append(
+            f"TTS BREAKER: {state}, {100 * br['error_rate']:.0f}% errors / {100 * br['slow_rate']:.0f}% slow recently, "
+            f"tripped {br['trips']}x, {br['rejected']} refused, {self.tts.retries} retries"
+        )
+        http = self.tts.http_stats()
+        if http:
+            lines.append(
+                f"TTS HTTP (last {http['requests']}): connect {http['connect_ms']:.0f}ms, ttfb {http['ttfb_ms']:.0f}ms, "
+                f"body {http['body_ms']:.0f}ms, {100 * http['reused']:.0f}% reused connections"
+            )
+        disk = self.tts.disk_cache_stats()
+        if disk:
+            lookups = disk["hits"] + disk["misses"]
+            hit_rate = f"{100 * disk['hits'] / lookups:.0f}%" if lookups else "n/a"
+            lines.append(f"TTS DISK CACHE: {disk['items']} clips, {disk['bytes'] // (1024 * 1024)} MB, {hit_rate} hit rate, {disk['evictions']} evicted")
+
         await ctx.send("\n".join(lines), suppress_embeds=True)
 
     @narrate_root.command(name="channel")
@@ -909,7 +1822,7 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
 
             # If nobody remaining in the bot VC has narrate enabled → shut down
             try:
-                still_has_enabled = await self._any_enabled_in_channel(guild, bot_chan) if bot_chan else False
+                still_has_enabled = await self._any_enabled_in_channel(guild.id, bot_chan) if bot_chan else False
             except Exception as e:
                 print(f"[narrate] enabled check error: {e}")
                 still_has_enabled = True  # be conservative
@@ -944,6 +1857,8 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
         """Narrate message into voice chat if appropriate. Bot commands are ignored here."""
         if message.author.bot or not message.guild:
             return
+        if not self._narration_possible(message.guild.id):
+            return  # the common case: nobody in this guild has narration on
         if _message_is_narrate_command(self.bot, message.content):
             return
         if _is_link_emoji_or_mention_only(message.content or ""):
@@ -966,15 +1881,110 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
             rate = float(pref.get("rate") if pref.get("rate") is not None else DEFAULT_RATE)
         except Exception:
             rate = DEFAULT_RATE
-        await self._narrate_queue.put((message.guild.id, message.author.id, cleaned, voice, language_code, rate, message.channel.id))
+        item = (message.author.id, cleaned, voice, language_code, rate, message.channel.id, time.monotonic())
+        if COALESCE_WINDOW_SECS > 0:
+            await self._coalesce(message.guild.id, item)
+        else:
+            await self._narrate_queue.put(message.guild.id, item)
+
+    async def _coalesce(self, guild_id: int, item: tuple):
+        """
+        Hold a message for COALESCE_WINDOW_SECS in case the same user sends more.
+        Anything that arrives in the window with the same voice/rate/channel is merged into
+        it, as long as the result still fits in one MAX_CHARS_PER_CHUNK request.
+        """
+        key = (guild_id, item[0])
+        pending = self._coalescing.get(key)
+        if pending:
+            held = pending["item"]
+            text = join_messages(held[1], item[1])
+            if held[2:6] == item[2:6] and len(text) <= MAX_CHARS_PER_CHUNK:
+                pending["item"] = (held[0], text) + held[2:]  # keeps the first message's received_at
+                self._coalesced[guild_id] += 1
+                return
+            await self._flush_coalesced(key)
+        if len(item[1]) >= MAX_CHARS_PER_CHUNK:
+            await self._narrate_queue.put(guild_id, item)  # nothing could be merged into it anyway
+            return
+        self._coalescing[key] = {
+            "item": item,
+            "task": asyncio.create_task(self._flush_coalesced(key, after=COALESCE_WINDOW_SECS)),
+        }
+
+    async def _flush_coalesced(self, key: Tuple[int, int], after: float = 0.0):
+        if after:
+            await asyncio.sleep(after)
+        pending = self._coalescing.pop(key, None)
+        if pending is None:
+            return
+        if pending["task"] is not asyncio.current_task():
+            pending["task"].cancel()
+        await self._narrate_queue.put(key[0], pending["item"])
+
+    async def _phrase_warmer(self):
+        last_decay = time.monotonic()
+        try:
+            while True:
+                await asyncio.sleep(WARM_INTERVAL_SECS)
+                now = time.monotonic()
+                if now - last_decay >= WARM_DECAY_SECS:
+                    self._phrases.decay()
+                    last_decay = now
+                if now - self._last_narration < WARM_IDLE_SECS:
+                    continue
+                try:
+                    await self._warm_phrases()
+                except Exception as e:
+                    print(f"[narrate] phrase warmer error: {e}")
+        except asyncio.CancelledError:
+            return
+
+    async def _warm_phrases(self):
+        """
+        Synthesize the most frequent phrases that aren't in the memory cache, within WARM_API_BUDGET_PER_DAY.
+        Clips that are only on disk come back from there without using any budget. Stops as soon as real
+        narration starts again so it never competes with it for the TTS concurrency.
+        """
+        now = time.monotonic()
+        while self._warm_calls and now - self._warm_calls[0] > 24 * 3600:
+            self._warm_calls.popleft()
+        if self.tts.breaker.state != "closed":
+            return  # don't spend probes on speculation
+        started = self._last_narration
+        warmed = 0
+        for (voice, language_code, rate), phrase, _ in self._phrases.top(WARM_TOP_K, WARM_MIN_COUNT):
+            if len(self._warm_calls) >= WARM_API_BUDGET_PER_DAY:
+                break
+            if self._last_narration != started or self._narrate_queue.qsize() or self._narrate_queue.in_flight():
+                break
+            if self.tts.is_cached(phrase, voice, language_code, rate):
+                continue
+            calls = self.tts.api_calls
+            try:
+                await self.tts.synth(phrase, voice_name=voice, language_code=language_code, speaking_rate=rate)
+                warmed += 1
+            except Exception as e:
+                # one bad phrase shouldn't stop the ones ranked below it
+                print(f"[narrate] warming {phrase!r} failed: {e}")
+                if self.tts.breaker.state != "closed":
+                    break
+            finally:
+                # failed attempts and retries went out too, so they count against the budget
+                now = time.monotonic()
+                self._warm_calls.extend(now for _ in range(self.tts.api_calls - calls))
+        if warmed:
+            print(f"[narrate] pre-synthesized {warmed} common phrase(s), {len(self._warm_calls)}/{WARM_API_BUDGET_PER_DAY} warm API calls used today")
 
     async def _narrate_worker(self):
         try:
             while True:
-                guild_id, user_id, text, voice, language_code, rate, channel_id = await self._narrate_queue.get()
+                guild_id, (user_id, text, voice, language_code, rate, channel_id, received_at) = await self._narrate_queue.get()
                 try:
                     if not text:
                         continue
+                    if time.monotonic() - received_at > NARRATE_STALE_SECS:
+                        self._stale[guild_id] += 1  # e.g. backed up behind a TTS outage; the moment has passed
+                        continue
 
                     guild = self.bot.get_guild(guild_id)
                     if not guild:
@@ -983,42 +1993,76 @@ class NarrationCog(DbMixin, commands.Cog, name="Narrate"):
                     if not member or not (member.voice and member.voice.channel):
                         continue
 
-                    async with self._guild_lock(guild_id):
-                        session = self._get_session(guild_id)
-                        try:
-                            await session.ensure_connected(member.voice.channel)
-                        except Exception as e:
-                            print(f"[narrate] ensure_connected error: {e}")
-                            continue
-
-                        chunks = chunk_text(text, MAX_CHARS_PER_CHUNK)
-                        if not chunks:
-                            continue
+                    # the queue hands a guild to one worker at a time, so no per-guild lock is needed here
+                    session = self._get_session(guild_id)
+                    try:
+                        await session.ensure_connected(member.voice.channel)
+                    except Exception as e:
+                        print(f"[narrate] ensure_connected error: {e}")
+                        continue
 
-                        async def synth_chunk(t: str) -> bytes:
-                            return await self.tts.synth(
-                                t, voice_name=voice, language_code=language_code, speaking_rate=rate
-                            )
-
-                        try:
-                            for part in chunks:
-                                data = await synth_chunk(part)
-                                await session.enqueue(data)
-                        except Exception as e:
-                            ch = guild.get_channel(channel_id)
-                            if ch:
+                    chunks = chunk_text(text, MAX_CHARS_PER_CHUNK)
+                    if not chunks:
+                        continue
+                    self._last_narration = time.monotonic()
+
+                    async def synth_chunk(t: str) -> bytes:
+                        audio = await self.tts.synth(
+                            t, voice_name=voice, language_code=language_code, speaking_rate=rate
+                        )
+                        # only phrases that synthesized fine are worth warming; a bad voice would fail forever
+                        if len(t) <= WARM_MAX_CHARS:
+                            self._phrases.add((voice, language_code, rate), t)
+                        return audio
+
+                    # PIPELINED: every chunk is requested up front (the global semaphore still caps
+                    # concurrency, first chunk first) and they're enqueued in order as each lands,
+                    # so a long message costs ~1 TTS round trip before audio instead of N
+                    if PIPELINED_SYNTH:
+                        pending = [asyncio.create_task(synth_chunk(part)) for part in chunks]
+                    else:
+                        pending = []
+                    first_audio_at = None
+                    try:
+                        for i, part in enumerate(chunks):
+                            data = await (pending[i] if pending else synth_chunk(part))
+                            await session.enqueue(data, user_id, received_at)
+                            if first_audio_at is None:
+                                first_audio_at = time.monotonic()
+                        done_at = time.monotonic()
+                        print(
+                            f"[narrate] guild {guild_id}: {len(chunks)} chunk(s), "
+                            f"first audio {first_audio_at - received_at:.2f}s, total {done_at - received_at:.2f}s"
+                        )
+                    except Exception as e:
+                        for task in pending:
+                            task.cancel()
+                        await asyncio.gather(*pending, return_exceptions=True)
+                        print(f"[narrate] synth error: {e}")
+                        ch = guild.get_channel(channel_id)
+                        if isinstance(e, TTSTransientError):
+                            continue  # google hiccup; the breaker decides when it's an outage worth mentioning
+                        if isinstance(e, TTSUnavailable):
+                            # once per outage per guild, not once per message
+                            if ch and self._outage_noticed.get(guild_id) != self.tts.breaker.trips:
+                                self._outage_noticed[guild_id] = self.tts.breaker.trips
                                 try:
-                                    await ch.send(
-                                        "TTS failed. Ensure you used the exact **Name** from Google’s voice list "
-                                        "(e.g., `en-US-Wavenet-D` or `en-US-Chirp3-HD-Gacrux`).\n"
-                                        "See: https://cloud.google.com/text-to-speech/docs/voices",
-                                        suppress_embeds=True,
-                                    )
+                                    await ch.send("Google TTS is having problems, so narration is skipping messages for now.")
                                 except Exception:
                                     pass
-                            print(f"[narrate] synth error: {e}")
                             continue
+                        if ch:
+                            try:
+                                await ch.send(
+                                    "TTS failed. Ensure you used the exact **Name** from Google’s voice list "
+                                    "(e.g., `en-US-Wavenet-D` or `en-US-Chirp3-HD-Gacrux`).\n"
+                                    "See: https://cloud.google.com/text-to-speech/docs/voices",
+                                    suppress_embeds=True,
+                                )
+                            except Exception:
+                                pass
+                        continue
                 finally:
-                    self._narrate_queue.task_done()
+                    await self._narrate_queue.task_done(guild_id)
         except asyncio.CancelledError:
             return
@@ -0,0 +1,133 @@
+# fake_tts_server.py
+# Local stand-in for texttospeech.googleapis.com/v1/text:synthesize, for load testing narration without billing Google.
+# Returns real OGG/Opus (20 ms silence packets, padded out to the requested size) so the whole playback path works.
+#
+#   python fake_tts_server.py --port 8089 --latency 0.25 --jitter 0.1 --error-rate 0.02
+#   GOOGLE_TTS_ENDPOINT="http://127.0.0.1:8089/v1/text:synthesize?key={api_key}" python bot.py
+
+import argparse
+import asyncio
+import base64
+import random
+import struct
+from typing import List
+
+from aiohttp import web
+
+SECS_PER_CHAR = 0.06        # about how long google takes to say one character at rate 1.0
+BYTES_PER_SEC = 4000        # ~32 kbps, what google's OGG_OPUS clips usually come out at
+
+_SILENCE = b"\xff\xfe"      # a 20 ms CELT silence frame (goes after the TOC byte)
+
+
+def _crc_table() -> List[int]:
+    table = []
+    for i in range(256):
+        r = i << 24
+        for _ in range(8):
+            r = ((r << 1) ^ 0x04C11DB7) if r & 0x80000000 else (r << 1)
+        table.append(r & 0xFFFFFFFF)
+    return table
+
+_CRC_TABLE = _crc_table()
+
+def _page(packets: List[bytes], seq: int, granule: int, flag: int = 0) -> bytes:
+    lacing = []
+    for packet in packets:
+        lacing += [255] * (len(packet) // 255) + [len(packet) % 255]
+    body = b"".join(packets)
+    header = struct.pack("<4sBBqIII", b"OggS", 0, flag, granule, 0x4D454C4E, seq, 0) + bytes([len(lacing)]) + bytes(lacing)
+    crc = 0
+    for b in header + body:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _CRC_TABLE[((crc >> 24) ^ b) & 0xFF]
+    return header[:22] + struct.pack("<I", crc) + header[26:] + body
+
+def _silence_packet(size: int) -> bytes:
+    """a 20 ms silence packet padded out to about `size` bytes (opus code 3: one frame, padding flag set)"""
+    pad = max(0, size - 4 - ((size - 4) // 255 + 1))
+    pad_len = b"\xff" * (pad // 254) + bytes([pad % 254])  # each 255 means 254 bytes of padding and keep going
+    return bytes([0xFB, 0x41]) + pad_len + _SILENCE + bytes(pad)
+
+def silent_ogg_opus(secs: float, nbytes: int, pre_skip: int = 312) -> bytes:
+    """an OGG/Opus file of `secs` seconds of silence, about `nbytes` long"""
+    frames = max(1, round(secs / 0.02))
+    packet = _silence_packet(max(3, nbytes // frames))
+    head = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, pre_skip, 48000, 0, 0)
+    tags = b"OpusTags" + struct.pack("<I", 4) + b"fake" + struct.pack("<I", 0)
+    pages = [_page([head], 0, 0, flag=2), _page([tags], 1, 0)]
+    # up to a second of packets per page like google, fewer if they'd need more than 255 lacing values
+    per_page = max(1, min(50, 255 // (len(packet) // 255 + 1)))
+    for start in range(0, frames, per_page):
+        count = min(per_page, frames - start)
+        last = start + count == frames
+        granule = pre_skip + (start + count) * 960
+        pages.append(_page([packet] * count, len(pages), granule, flag=4 if last else 0))
+    return b"".join(pages)
+
+
+class FakeTTSServer:
+    """
+    aiohttp app answering POST /v1/text:synthesize the way google does ({"audioContent": base64}).
+    latency (+ uniform jitter) is slept before answering, error_rate of requests get a 500,
+    and clips are sized like google's: SECS_PER_CHAR of audio per character (divided by speakingRate)
+    at BYTES_PER_SEC, unless clip_bytes pins the size.
+    """
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0, error_rate: float = 0.0, clip_bytes: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.clip_bytes = clip_bytes
+        self.requests = 0
+        self.errors = 0
+        self._runner = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/text:synthesize", self._synthesize)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8089) -> str:
+        """serve in the current event loop. returns the endpoint to put in GOOGLE_TTS_ENDPOINT"""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]  # the real one if port was 0
+        return f"http://{host}:{port}/v1/text:synthesize?key={{api_key}}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _synthesize(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        payload = await request.json()
+        text = payload.get("input", {}).get("text", "")
+        rate = float(payload.get("audioConfig", {}).get("speakingRate", 1.0) or 1.0)
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"error": {"code": 500, "message": "fake failure"}}, status=500)
+        secs = max(0.2, len(text) * SECS_PER_CHAR / rate)
+        audio = silent_ogg_opus(secs, self.clip_bytes or int(secs * BYTES_PER_SEC))
+        return web.json_response({"audioContent": base64.b64encode(audio).decode("ascii")})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="fake google tts endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds, uniformly")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that get a 500")
+    parser.add_argument("--clip-bytes", type=int, default=0, help="fixed clip size instead of sizing by text length")
+    args = parser.parse_args()
+
+    async def main():
+        server = FakeTTSServer(args.latency, args.jitter, args.error_rate, args.clip_bytes)
+        endpoint = await server.start(args.host, args.port)
+        print(f"fake tts listening, set GOOGLE_TTS_ENDPOINT={endpoint}")
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
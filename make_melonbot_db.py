@@ -58,6 +58,16 @@ def make_db():
                 FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
                 FOREIGN KEY (movie_id) REFERENCES movies (id) ON DELETE CASCADE,
                 UNIQUE (guild_id, user_id, movie_id))""")
+    # full text + trigram search for !reviews. the tsvector is generated so it can never drift from review_text
+    cur.execute("""CREATE EXTENSION IF NOT EXISTS pg_trgm""")
+    cur.execute("""ALTER TABLE reviews ADD COLUMN IF NOT EXISTS review_tsv tsvector
+                GENERATED ALWAYS AS (to_tsvector('simple', review_text)) STORED""")
+    cur.execute("""CREATE INDEX IF NOT EXISTS reviews_review_tsv_idx
+                ON reviews USING GIN (review_tsv)""")
+    cur.execute("""CREATE INDEX IF NOT EXISTS movies_title_trgm_idx
+                ON movies USING GIN (lower(title::text) gin_trgm_ops)""")
+    cur.execute("""CREATE INDEX IF NOT EXISTS reviews_review_text_trgm_idx
+                ON reviews USING GIN (lower(review_text) gin_trgm_ops)""")
     cur.execute("""CREATE TABLE IF NOT EXISTS narrate_prefs (
                 guild_id        BIGINT NOT NULL,
                 user_id         BIGINT NOT NULL,
@@ -1,3 +1,7 @@
+import heapq
+import itertools
+from collections import defaultdict
+
 class Substrings:
     def __init__(self, term):
         self.name = term.lower()
@@ -90,3 +94,205 @@ def find_best_match(search_term, comparator):
     score = search_term_extra_letter_penalty * comparator_extra_letter_penalty
     score = round(score, 2)
     return best_match, score
+
+
+class SearchIndex:
+    """n-gram postings over a bank of (term, identifier) pairs, built once and updated with add()/remove().
+    rank() returns the same scores and order as rank_matches() on the same bank,
+    but only the items that share a trigram with the search term get a full longest-common-substring check.
+    items sharing only a bigram or a single letter score with a match length of 2 or 1 straight from the postings."""
+    
+    def __init__(self, bank=()):
+        self._items = []  # slot -> (term, identifier, lowered term) or None once removed. slot order = bank order
+        self._slots = defaultdict(list)  # (term, identifier) -> slots. banks can contain duplicates (i.e. two members with the same name)
+        self._postings = defaultdict(set)  # 1, 2 and 3 letter grams -> slots containing them
+        self._by_length = defaultdict(set)  # len(term) -> slots. short items are the only ones a short match can rank highly
+        for term, identifier in bank:
+            self.add(term, identifier)
+            
+    def __len__(self):
+        return sum(len(slots) for slots in self._by_length.values())
+    
+    def add(self, term, identifier):
+        lowered = term.lower()
+        slot = len(self._items)
+        self._items.append((term, identifier, lowered))
+        self._slots[(term, identifier)].append(slot)
+        self._by_length[len(term)].add(slot)
+        for gram in _grams(lowered):
+            self._postings[gram].add(slot)
+    
+    def remove(self, term, identifier):
+        """removes one copy of the item. returns False if it wasn't in the index"""
+        slots = self._slots.get((term, identifier))
+        if not slots:
+            return False
+        slot = slots.pop()
+        if not slots:
+            del self._slots[(term, identifier)]
+        _, _, lowered = self._items[slot]
+        self._items[slot] = None
+        self._by_length[len(term)].discard(slot)
+        if not self._by_length[len(term)]:
+            del self._by_length[len(term)]
+        for gram in _grams(lowered):
+            postings = self._postings[gram]
+            postings.discard(slot)
+            if not postings:
+                del self._postings[gram]
+        return True
+        
+    def rank(self, search_term, limit=None):
+        """[(term, identifier, score)] sorted like rank_matches(). limit returns only the top results"""
+        if not search_term:
+            scores = {}
+        else:
+            scores = self._scores(search_term, limit)
+        if limit is None:
+            hits = sorted(scores, key=lambda slot: (-scores[slot], slot))
+        else:
+            hits = heapq.nsmallest(limit, scores, key=lambda slot: (-scores[slot], slot))
+        ranked = [(self._items[slot][0], self._items[slot][1], scores[slot]) for slot in hits]
+        # everything else scores 0 and keeps its bank order, same as the stable sort in rank_matches()
+        for slot, item in enumerate(self._items):
+            if limit is not None and len(ranked) >= limit:
+                break
+            if item is not None and slot not in scores:
+                ranked.append((item[0], item[1], 0.0))
+        return ranked
+        
+    def scores(self, search_term):
+        """{term: score} for every item scoring above 0, for callers that look scores up by term instead of ranking.
+        find_best_match() scores are symmetric, so this is also find_best_match(term, search_term) for every term"""
+        if not search_term:
+            return {}
+        return {self._items[slot][0]: score for slot, score in self._scores(search_term, None).items()}
+        
+    def _scores(self, search_term, limit):
+        """slot -> find_best_match() score, for slots with a score above 0"""
+        query = search_term.lower()
+        query_grams = _substrings_by_length(query)
+        match_lengths = {}
+        candidates = set()
+        for gram in query_grams.get(3, ()):
+            candidates.update(self._postings.get(gram, ()))
+        for slot in candidates:
+            match_lengths[slot] = _longest_common_length(self._items[slot][2], query_grams)
+        scores = {}
+        for slot, match_length in match_lengths.items():
+            score = _score(match_length, len(search_term), len(self._items[slot][0]))
+            if score:
+                scores[slot] = score
+        for match_length in (2, 1):
+            if match_length not in query_grams:
+                continue
+            if limit is None:
+                slots = [slot for gram in query_grams[match_length] for slot in self._postings.get(gram, ()) if slot not in match_lengths]
+            else:
+                slots = self._short_match_slots(query_grams[match_length], match_length, search_term, match_lengths, scores, limit)
+            for slot in slots:
+                match_lengths[slot] = match_length
+                score = _score(match_length, len(search_term), len(self._items[slot][0]))
+                if score:
+                    scores[slot] = score
+        return scores
+        
+    def _short_match_slots(self, grams, match_length, search_term, match_lengths, scores, limit):
+        """slots with a match of match_length that could still make the top results.
+        within a match length the score only falls as items get longer, so walk the items shortest first
+        and stop once the next length can't beat the current last place"""
+        slots = []
+        for length in sorted(self._by_length):
+            if len(scores) + len(slots) >= limit:
+                pending = [_score(match_length, len(search_term), len(self._items[slot][0])) for slot in slots]
+                last_place = heapq.nlargest(limit, list(scores.values()) + pending)[-1]
+                if _score(match_length, len(search_term), length) < last_place:
+                    break
+            found = set()
+            for gram in grams:
+                found |= self._by_length[length] & self._postings.get(gram, set())
+            slots += [slot for slot in found if slot not in match_lengths]
+        return slots
+
+
+def merge_rankings(*rankings, limit=None):
+    """merges SearchIndex.rank() results into one ranking, same as ranking the concatenated banks.
+    on equal scores earlier rankings come first, like the earlier part of the bank would in rank_matches()"""
+    merged = heapq.merge(*rankings, key=lambda x: -x[2])
+    if limit is not None:
+        merged = itertools.islice(merged, limit)
+    return list(merged)
+
+
+def _grams(lowered, max_length=3):
+    grams = set()
+    for n in range(1, max_length + 1):
+        for i in range(len(lowered) - n + 1):
+            grams.add(lowered[i:i+n])
+    return grams
+    
+def _substrings_by_length(lowered):
+    substrings = defaultdict(set)
+    for n in range(1, len(lowered) + 1):
+        for i in range(len(lowered) - n + 1):
+            substrings[n].add(lowered[i:i+n])
+    return substrings
+    
+def _longest_common_length(lowered, query_substrings, known_length=3):
+    # any substring of a common substring is also common, so the first length with no match is the end
+    length = known_length
+    while length + 1 in query_substrings and length < len(lowered):
+        frames = query_substrings[length + 1]
+        if not any(lowered[i:i+length+1] in frames for i in range(len(lowered) - length)):
+            break
+        length += 1
+    return length
+    
+def _score(match_length, search_length, comparator_length):
+    # same arithmetic as find_best_match() so the rounding comes out identical
+    if not comparator_length:
+        return 0.0
+    score = (match_length / search_length) * (match_length / comparator_length)
+    return round(score, 2)
+
+
+if __name__ == "__main__":
+    # equivalence check of SearchIndex against rank_matches(), plus a rough timing
+    import random
+    import string
+    import time
+    random.seed(0)
+    letters = string.ascii_lowercase + "  '"
+    def random_title():
+        return "".join(random.choice(letters) for _ in range(random.randint(1, 30))).strip() or "a"
+    bank = [(random_title(), random.choice(["username", "movie"])) for _ in range(1000)]
+    bank += bank[:20]  # duplicates
+    bank.sort(key=lambda x: x[1], reverse=True)  # usernames first, like find() builds it
+    index = SearchIndex(bank)
+    usernames = [item for item in bank if item[1] == "username"]
+    movies = [item for item in bank if item[1] == "movie"]
+    username_index, movie_index = SearchIndex(usernames), SearchIndex(movies)
+    queries = [random_title()[:random.randint(1, 12)] for _ in range(100)] + [term for term, _ in bank[:30]]
+    for query in queries:
+        expected = rank_matches(query, bank)
+        assert index.rank(query) == expected, query
+        assert index.rank(query, limit=10) == expected[:10], query
+        assert merge_rankings(username_index.rank(query), movie_index.rank(query)) == expected, query
+    for term, identifier in bank[::3]:
+        index.remove(term, identifier)
+    remaining_index = SearchIndex([item for slot, item in enumerate(bank) if slot % 3])
+    for query in queries[:30]:
+        assert [i[2] for i in index.rank(query)] == [i[2] for i in remaining_index.rank(query)], query
+    print(f"SearchIndex matches rank_matches for {len(queries)} queries")
+
+    big_bank = [(random_title(), "movie") for _ in range(20000)]
+    big_index = SearchIndex(big_bank)
+    start = time.perf_counter()
+    for query in queries:
+        big_index.rank(query, limit=1)
+    per_query = (time.perf_counter() - start) / len(queries) * 1000
+    start = time.perf_counter()
+    for query in queries[:10]:
+        rank_matches(query, big_bank)
+    brute_per_query = (time.perf_counter() - start) / 10 * 1000
+    print(f"20000 items: SearchIndex {per_query:.2f}ms/query, rank_matches {brute_per_query:.1f}ms/query")
@@ -0,0 +1,94 @@
+import itertools
+from matching import SearchIndex
+
+# shared by every GuildMembers, so a guild that's rebuilt never hands out a version it already used
+_next_version = itertools.count(1).__next__
+
+class GuildMembers:
+    """id -> name for one guild's members, plus a SearchIndex of (name, id) for fuzzy name lookups
+    and one of (word of the name, id) for matching single words against names, like review search does.
+    version goes up whenever a name comes or goes, so anything that drew names (cached plots) can tell it's stale"""
+    def __init__(self, members):
+        self.version = _next_version()
+        self._names = {}
+        self.search_index = SearchIndex()
+        self.word_index = SearchIndex()
+        for member in members:
+            self.add(member.id, member.name)
+
+    def __contains__(self, user_id):
+        return user_id in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+    def items(self):
+        return self._names.items()
+
+    def name(self, user_id):
+        return self._names.get(user_id)
+
+    def add(self, user_id, name):
+        self.remove(user_id)
+        self._names[user_id] = name
+        self.search_index.add(name, user_id)
+        for word in name.split():
+            self.word_index.add(word, user_id)
+        self.version = _next_version()
+
+    def remove(self, user_id):
+        name = self._names.pop(user_id, None)
+        if name is not None:
+            self.search_index.remove(name, user_id)
+            for word in name.split():
+                self.word_index.remove(word, user_id)
+            self.version = _next_version()
+
+    def best_match(self, name, threshold=0.5):
+        """(user_id, score) of the closest name, same scoring as find_closest_match_and_score. (None, None) if nothing beats threshold"""
+        ranked = self.search_index.rank(name, limit=1)
+        if ranked and ranked[0][2] > threshold:
+            return ranked[0][1], ranked[0][2]
+        return None, None
+
+
+class MemberDirectory:
+    """guild_id -> GuildMembers. built from guild.members the first time a guild is asked for,
+    then kept current by the member join/update/remove (and user update, for username changes) events"""
+    def __init__(self):
+        self._guilds = {}
+
+    def get(self, guild):
+        members = self._guilds.get(guild.id)
+        if members is None:
+            members = self._guilds[guild.id] = GuildMembers(guild.members)
+        return members
+
+    def member_joined(self, member):
+        members = self._guilds.get(member.guild.id)
+        if members is not None:
+            members.add(member.id, member.name)
+
+    def member_updated(self, before, after):
+        members = self._guilds.get(after.guild.id)
+        if members is not None and members.name(after.id) != after.name:
+            members.add(after.id, after.name)
+
+    def member_removed(self, member):
+        members = self._guilds.get(member.guild.id)
+        if members is not None:
+            members.remove(member.id)
+
+    def user_updated(self, before, after):
+        # usernames belong to the user, not the member, so they change in every guild at once
+        if before.name == after.name:
+            return
+        for members in self._guilds.values():
+            if after.id in members:
+                members.add(after.id, after.name)
+
+    def invalidate(self, guild_id=None):
+        if guild_id is None:
+            self._guilds.clear()
+        else:
+            self._guilds.pop(guild_id, None)
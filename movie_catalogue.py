@@ -0,0 +1,112 @@
+import asyncio
+from matching import SearchIndex
+
+class GuildMovies:
+    """in-memory copy of one guild's rows in the movies table.
+    titles are CITEXT in postgres, so title lookups here are case insensitive too."""
+    def __init__(self, rows):
+        self._by_id = {}
+        self._by_title = {}
+        self.search_index = SearchIndex()  # lowercased titles, same bank find() used to build
+        for row in rows:
+            self._put(dict(row))
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def all(self):
+        return [dict(movie) for movie in self._by_id.values()]
+
+    def find_exact(self, title):
+        movie = self._by_title.get(title.lower())
+        return dict(movie) if movie else None
+
+    def find_by_id(self, movie_id):
+        movie = self._by_id.get(movie_id)
+        return dict(movie) if movie else None
+
+    def put(self, row):
+        """add a new row (i.e. from INSERT ... RETURNING *) or replace an existing one"""
+        self._discard(row['id'])
+        self._put(dict(row))
+
+    def update(self, movie_id, **fields):
+        movie = self._by_id.get(movie_id)
+        if not movie:
+            return
+        movie.update(fields)
+
+    def discard(self, movie_id):
+        self._discard(movie_id)
+
+    def _put(self, movie):
+        self._by_id[movie['id']] = movie
+        self._by_title[movie['title'].lower()] = movie
+        self.search_index.add(movie['title'].lower(), "movie")
+
+    def _discard(self, movie_id):
+        movie = self._by_id.pop(movie_id, None)
+        if not movie:
+            return False
+        self._by_title.pop(movie['title'].lower(), None)
+        self.search_index.remove(movie['title'].lower(), "movie")
+        return True
+
+
+class MovieCatalogue:
+    """guild_id -> GuildMovies. a guild is loaded from the db the first time it's asked for,
+    after that the write paths (add/remove/rate/unrate/transfer/change_date_watched) keep it current.
+    writes for a guild that hasn't been loaded yet are ignored since the next load will pick them up anyway.
+    writes that land while a load is running are kept and replayed on top of it, since the load's SELECT
+    may have run before they were committed."""
+    def __init__(self):
+        self._guilds = {}
+        self._load_locks = {}
+        self._loading = {}  # guild_id -> [(method name, args, kwargs)] written during the load
+
+    async def get(self, db, guild_id):
+        movies = self._guilds.get(guild_id)
+        if movies is not None:
+            return movies
+        lock = self._load_locks.setdefault(guild_id, asyncio.Lock())
+        async with lock:
+            movies = self._guilds.get(guild_id)  # another command may have loaded it while we waited
+            if movies is None:
+                pending = self._loading[guild_id] = []
+                try:
+                    rows = await db.fetch("SELECT * FROM movies WHERE guild_id=$1", guild_id)
+                finally:
+                    # invalidate() takes the list away if the load went stale while it ran
+                    current = self._loading.pop(guild_id, None) is pending
+                movies = GuildMovies(rows)
+                for name, args, kwargs in pending:  # all idempotent, so a write the SELECT already saw is harmless
+                    getattr(movies, name)(*args, **kwargs)
+                if current:
+                    self._guilds[guild_id] = movies
+        return movies
+
+    def put(self, guild_id, row):
+        self._write(guild_id, "put", row)
+
+    def update(self, guild_id, movie_id, **fields):
+        self._write(guild_id, "update", movie_id, **fields)
+
+    def discard(self, guild_id, movie_id):
+        self._write(guild_id, "discard", movie_id)
+
+    def invalidate(self, guild_id=None):
+        """drop a guild (or everything) so it gets reloaded, i.e. after editing the movies table outside the bot.
+        a load that's running at the time still answers its callers but isn't kept"""
+        if guild_id is None:
+            self._guilds.clear()
+            self._loading.clear()
+        else:
+            self._guilds.pop(guild_id, None)
+            self._loading.pop(guild_id, None)
+
+    def _write(self, guild_id, name, *args, **kwargs):
+        movies = self._guilds.get(guild_id)
+        if movies is not None:
+            getattr(movies, name)(*args, **kwargs)
+        elif guild_id in self._loading:
+            self._loading[guild_id].append((name, args, kwargs))
@@ -0,0 +1,149 @@
+# narrate_bench.py
+# Load test for narration: N guilds x M speakers pushing messages through NarrationCog._narrate_worker
+# against fake_tts_server.py (no Discord, no Google bill). Voice is faked out, so this measures the
+# queue -> synth -> enqueue path: throughput, time to first audio and tail latency.
+#
+#   python narrate_bench.py --guilds 20 --speakers 3 --messages 10 --rate 0.5 --latency 0.25 --jitter 0.2
+
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+import bot_narrate
+from fake_tts_server import FakeTTSServer
+
+WORDS = ("the movie was honestly way better than i expected but the ending dragged on and the "
+         "soundtrack carried most of it anyway who picked this one again lol next week is my pick").split()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class BenchSession(bot_narrate.GuildVoiceSession):
+    """a guild session that never touches voice; it just notes when each message's chunks land"""
+    def __init__(self, bot, guild_id, tts, results):
+        super().__init__(bot, guild_id, tts)
+        self.results = results
+
+    async def ensure_connected(self, channel) -> None:
+        return None
+
+    async def enqueue(self, audio_bytes: bytes, speaker_id: int = 0, message_key: object = None):
+        now = time.monotonic()
+        rec = self.results.setdefault((speaker_id, message_key), {"first": now, "chunks": 0})
+        rec["last"] = now
+        rec["chunks"] += 1
+        rec["bytes"] = rec.get("bytes", 0) + len(audio_bytes)
+
+
+class FakeBot:
+    """just enough of commands.Bot for the narrate worker: every member is always in a voice channel"""
+    def __init__(self):
+        self._guilds = {}
+
+    def get_guild(self, guild_id):
+        guild = self._guilds.get(guild_id)
+        if guild is None:
+            channel = SimpleNamespace(id=guild_id, name=f"vc-{guild_id}")
+            member = SimpleNamespace(voice=SimpleNamespace(channel=channel))
+            guild = self._guilds[guild_id] = SimpleNamespace(
+                id=guild_id,
+                get_member=lambda user_id: member,
+                get_channel=lambda channel_id: None,
+            )
+        return guild
+
+
+async def _speaker(cog, guild_id: int, user_id: int, messages: int, rate: float, sent: Dict[Tuple[int, float], int]):
+    for _ in range(messages):
+        await asyncio.sleep(random.expovariate(rate))
+        words = random.randint(3, 60)
+        text = " ".join(random.choice(WORDS) for _ in range(words))
+        received_at = time.monotonic()
+        sent[(user_id, received_at)] = len(bot_narrate.chunk_text(text))
+        item = (user_id, text, bot_narrate.DEFAULT_VOICE, bot_narrate.DEFAULT_LANG, 1.0, 0, received_at)
+        await cog._narrate_queue.put(guild_id, item)
+
+
+async def run_bench(guilds: int, speakers: int, messages: int, rate: float, server: FakeTTSServer) -> Dict[str, float]:
+    bot_narrate.GOOGLE_TTS_ENDPOINT = await server.start(port=0)
+    bot_narrate.DISK_CACHE_DIR = None  # every message should be a real request
+    results: Dict[Tuple[int, object], dict] = {}
+    bot = FakeBot()
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):  # the worker prints a line per message
+        cog = bot_narrate.NarrationCog(bot)
+        cog.tts._cache = bot_narrate.LRUCache(0)
+        cog._get_session = lambda guild_id: cog.guild_sessions.setdefault(
+            guild_id, BenchSession(bot, guild_id, cog.tts, results))
+        sent: Dict[Tuple[int, float], int] = {}  # (user_id, received_at) -> chunks it should produce
+        start = time.monotonic()
+        await asyncio.gather(*(
+            _speaker(cog, g, g * 1000 + s, messages, rate, sent)
+            for g in range(1, guilds + 1) for s in range(speakers)
+        ))
+        while cog._narrate_queue.qsize() or cog._narrate_queue.in_flight():
+            await asyncio.sleep(0.01)
+        elapsed = time.monotonic() - start
+        for t in cog._workers:
+            t.cancel()
+        await asyncio.gather(*cog._workers, return_exceptions=True)
+        await cog.tts.close()
+    await server.stop()
+
+    # messages that failed partway through have some chunks in results but don't count
+    results = {key: rec for key, rec in results.items() if rec["chunks"] == sent.get(key)}
+    first = [rec["first"] - key[1] for key, rec in results.items()]
+    total = [rec["last"] - key[1] for key, rec in results.items()]
+    chunks = sum(rec["chunks"] for rec in results.values())
+    dropped = sum(int(st["dropped"]) for st in cog._narrate_queue.stats.values())
+    return {
+        "sent": len(sent),
+        "completed": len(results),
+        "dropped": dropped,
+        "failed": log.getvalue().count("synth error"),
+        "requests": server.requests,
+        "elapsed": elapsed,
+        "msgs_per_sec": len(results) / elapsed,
+        "chunks_per_sec": chunks / elapsed,
+        "first_p50": percentile(first, 50),
+        "first_p95": percentile(first, 95),
+        "first_p99": percentile(first, 99),
+        "total_p50": percentile(total, 50),
+        "total_p95": percentile(total, 95),
+        "total_p99": percentile(total, 99),
+        "total_max": max(total, default=float("nan")),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="narration load benchmark against a fake tts server")
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--speakers", type=int, default=3, help="per guild")
+    parser.add_argument("--messages", type=int, default=10, help="per speaker")
+    parser.add_argument("--rate", type=float, default=0.5, help="messages per second per speaker (poisson)")
+    parser.add_argument("--latency", type=float, default=0.25)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    server = FakeTTSServer(args.latency, args.jitter, args.error_rate)
+    r = asyncio.run(run_bench(args.guilds, args.speakers, args.messages, args.rate, server))
+    print(f"{args.guilds} guilds x {args.speakers} speakers x {args.messages} msgs, "
+          f"tts latency {args.latency}s +{args.jitter}s, {args.error_rate:.0%} errors")
+    print(f"sent {r['sent']}, narrated {r['completed']}, dropped {r['dropped']}, failed {r['failed']}, "
+          f"{r['requests']} tts requests in {r['elapsed']:.1f}s")
+    print(f"throughput: {r['msgs_per_sec']:.1f} msgs/s, {r['chunks_per_sec']:.1f} chunks/s")
+    print(f"first audio: p50 {r['first_p50']:.2f}s  p95 {r['first_p95']:.2f}s  p99 {r['first_p99']:.2f}s")
+    print(f"whole msg:   p50 {r['total_p50']:.2f}s  p95 {r['total_p95']:.2f}s  p99 {r['total_p99']:.2f}s  max {r['total_max']:.2f}s")
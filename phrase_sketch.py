@@ -0,0 +1,92 @@
+import hashlib
+from array import array
+from typing import Dict, Hashable, List, Tuple
+
+
+class CountMinSketch:
+    """
+    Approximate counts in fixed memory (width * depth counters). Estimates never undercount;
+    they overcount by at most ~total/width with high probability. Uses conservative update
+    (only the counters at the current minimum go up), which tightens that a lot for skewed data.
+    """
+    def __init__(self, width: int = 4096, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.rows = [array("I", bytes(4 * width)) for _ in range(depth)]
+
+    def _cells(self, item: str) -> List[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[4 * i:4 * i + 4], "little") % self.width for i in range(self.depth)]
+
+    def add(self, item: str, count: int = 1) -> int:
+        """count item and return its new estimate"""
+        cells = self._cells(item)
+        estimate = min(row[c] for row, c in zip(self.rows, cells)) + count
+        for row, c in zip(self.rows, cells):
+            if row[c] < estimate:
+                row[c] = min(estimate, 0xFFFFFFFF)
+        return estimate
+
+    def estimate(self, item: str) -> int:
+        return min(row[c] for row, c in zip(self.rows, self._cells(item)))
+
+    def decay(self) -> None:
+        """halve everything, so phrases that stopped being said fade out"""
+        for row in self.rows:
+            for i, v in enumerate(row):
+                if v:
+                    row[i] = v >> 1
+
+
+class PhraseTracker:
+    """
+    Heavy hitters over a stream of (key, phrase) pairs: a CountMinSketch for the counts plus a small
+    table of the current top candidates, since a sketch alone can't say which items are frequent.
+    key is whatever else has to match for two phrases to be "the same" (e.g. the voice).
+    """
+    def __init__(self, capacity: int = 200, width: int = 4096, depth: int = 4):
+        self.capacity = capacity
+        self.sketch = CountMinSketch(width, depth)
+        self.candidates: Dict[Tuple[Hashable, str], int] = {}
+
+    def add(self, key: Hashable, phrase: str) -> int:
+        estimate = self.sketch.add(f"{key!r}\x1f{phrase}")
+        item = (key, phrase)
+        if item in self.candidates or len(self.candidates) < self.capacity:
+            self.candidates[item] = estimate
+        else:
+            weakest = min(self.candidates, key=self.candidates.get)
+            if estimate > self.candidates[weakest]:
+                del self.candidates[weakest]
+                self.candidates[item] = estimate
+        return estimate
+
+    def top(self, k: int, min_count: int = 1) -> List[Tuple[Hashable, str, int]]:
+        """the k most frequent (key, phrase, estimated count), most frequent first"""
+        ranked = sorted(self.candidates.items(), key=lambda kv: kv[1], reverse=True)
+        return [(key, phrase, count) for (key, phrase), count in ranked[:k] if count >= min_count]
+
+    def decay(self) -> None:
+        self.sketch.decay()
+        for item, count in list(self.candidates.items()):
+            if count <= 1:
+                del self.candidates[item]
+            else:
+                self.candidates[item] = count >> 1
+
+
+if __name__ == "__main__":
+    # zipf-ish stream: a few phrases said constantly, a long tail said once
+    import random
+    random.seed(0)
+    common = ["gg", "lol", "nice", "brb", "what", "no way", "same", "ok"]
+    tracker = PhraseTracker(capacity=50)
+    truth: Dict[str, int] = {}
+    for i in range(50_000):
+        phrase = random.choice(common[:random.randint(1, len(common))]) if random.random() < 0.3 else f"tail {i}"
+        truth[phrase] = truth.get(phrase, 0) + 1
+        tracker.add("en-US-Wavenet-D", phrase)
+    top = tracker.top(len(common))
+    assert {phrase for _, phrase, _ in top} == set(common), top
+    for _, phrase, count in top:
+        print(f"{phrase!r}: estimated {count}, actual {truth[phrase]}")
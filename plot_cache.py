@@ -0,0 +1,68 @@
+import hashlib
+from collections import OrderedDict
+
+PLOT_CACHE_BYTES = 32 * 1024 * 1024
+
+
+class PlotCache:
+    """rendered plot pngs, keyed by the command, its arguments and the guild's data version.
+    the data version goes up whenever a write path touches a guild's movies/ratings/reviews, so an entry can
+    never be served after its data changed; old entries just stop being asked for and fall off the end of the LRU.
+    plots that draw usernames also pass the guild's member directory version as an argument, for the same reason.
+    memory only: versions start over every run, so nothing cached could be trusted after a restart anyway"""
+    def __init__(self, max_bytes=PLOT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._versions = {}
+        self._memory = OrderedDict()  # key -> png bytes, least recently used first
+        self._memory_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def data_version(self, guild_id):
+        return self._versions.get(guild_id, 0)
+
+    def bump(self, guild_id):
+        """call after anything that changes what a guild's plots would show"""
+        self._versions[guild_id] = self._versions.get(guild_id, 0) + 1
+
+    def key(self, guild_id, command, *args):
+        raw = repr((guild_id, self.data_version(guild_id), command, args))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, key):
+        png = self._memory.get(key)
+        if png is None:
+            self.stats["misses"] += 1
+            return None
+        self._memory.move_to_end(key)
+        self.stats["hits"] += 1
+        return png
+
+    def put(self, key, png):
+        if key in self._memory or len(png) > self.max_bytes:
+            return
+        self._memory[key] = png
+        self._memory_bytes += len(png)
+        while self._memory_bytes > self.max_bytes:
+            old_key, old_png = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old_png)
+            self.stats["evictions"] += 1
+
+    def memory_bytes(self):
+        return self._memory_bytes
+
+
+if __name__ == "__main__":
+    # quick check of the lru + version bumps
+    cache = PlotCache(max_bytes=250)
+    keys = [cache.key(1, "plot_ratings", user_id) for user_id in range(4)]
+    for i, key in enumerate(keys):
+        cache.put(key, bytes([i]) * 100)
+    assert cache.memory_bytes() == 200  # 2 in memory, 2 evicted
+    assert cache.get(keys[0]) is None and cache.get(keys[1]) is None
+    assert cache.get(keys[2]) == bytes([2]) * 100
+    cache.put(cache.key(1, "plot_ratings", 4), bytes([4]) * 100)  # keys[3] is least recently used now
+    assert cache.get(keys[3]) is None and cache.get(keys[2]) is not None
+    cache.bump(1)
+    assert cache.key(1, "plot_ratings", 2) != keys[2]
+    assert cache.data_version(2) == 0  # other guilds keep their version
+    print(cache.stats, cache.memory_bytes())
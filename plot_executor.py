@@ -0,0 +1,178 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+PLOT_WORKERS = 2
+MAX_PENDING_PLOTS = 8  # running + waiting. past this, new plots are turned away instead of piling up
+PLOT_TIMEOUT = 60  # seconds
+
+
+class PlotQueueFull(Exception):
+    pass
+
+
+def _warm_worker():
+    # runs once in each worker process. pays for the matplotlib/seaborn/scipy imports up front
+    # so the first plot doesn't, and makes sure nothing tries to open a window
+    import matplotlib
+    matplotlib.use("Agg")
+    import plotting
+
+def _render(func_name, args, kwargs):
+    """runs in a worker. calls plotting.<func_name> and returns the png as bytes, since BytesIO doesn't pickle"""
+    import plotting
+    buf = getattr(plotting, func_name)(*args, **kwargs)
+    return buf.getvalue()
+
+def _worker_main(conn):
+    """a worker process: render jobs off the pipe one at a time until the parent hangs up"""
+    _warm_worker()
+    while True:
+        try:
+            func_name, args, kwargs = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = (True, _render(func_name, args, kwargs) if func_name else None)  # no func_name = warmup ping
+        except Exception as e:
+            result = (False, e)
+        try:
+            conn.send(result)
+        except Exception as e:  # the plot's exception didn't pickle
+            conn.send((False, RuntimeError(f"{func_name} failed: {result[1]!r} ({e})")))
+
+
+class _Worker:
+    """one worker process and the pipe to it. call() blocks, so it's run in a thread"""
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def call(self, job):
+        self.conn.send(job)
+        return self.conn.recv()
+
+    def kill(self):
+        # the thread blocked in call() gets an EOFError once the process is gone
+        self.process.terminate()
+
+
+class PlotExecutor:
+    """runs plotting.py functions in worker processes so matplotlib never blocks the event loop.
+    workers are spawned (not forked, the bot process has threads and open sockets) and warmed by start().
+    each worker runs one job at a time over its own pipe, so a job that runs past its timeout is dealt with
+    by killing just its worker and spawning a replacement; plots running in the other workers carry on"""
+    def __init__(self, workers=PLOT_WORKERS, max_pending=MAX_PENDING_PLOTS, timeout=PLOT_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = []
+        self._all = set()
+        self._slots = None
+        self._threads = None
+
+    async def start(self):
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        # one ping per worker waits for every process to finish _warm_worker
+        idle, self._idle = self._idle, []
+        try:
+            await asyncio.gather(*(loop.run_in_executor(self._threads, w.call, (None, (), {})) for w in idle))
+        finally:
+            self._idle.extend(idle)
+
+    async def render(self, func_name, *args, timeout=None, **kwargs):
+        """png bytes from plotting.<func_name>(*args, **kwargs). raises PlotQueueFull if too many plots are pending,
+        asyncio.TimeoutError if it takes too long, or whatever the plotting function raised"""
+        if self.pending >= self.max_pending:
+            raise PlotQueueFull(f"{self.pending} plots already pending")
+        self._ensure_started()
+        self.pending += 1
+        try:
+            async with self._slots:
+                # a slot with no idle worker means an earlier respawn failed; try again now
+                worker = self._idle.pop() if self._idle else self._spawn()
+                healthy = False
+                try:
+                    future = asyncio.get_running_loop().run_in_executor(
+                        self._threads, worker.call, (func_name, args, kwargs)
+                    )
+                    try:
+                        ok, result = await asyncio.wait_for(future, timeout or self.timeout)
+                    except asyncio.TimeoutError:
+                        print(f"Plot {func_name} timed out, replacing its worker")
+                        raise
+                    healthy = True
+                finally:
+                    # a worker that timed out, died, or was abandoned mid-job can't be reused
+                    if healthy:
+                        self._idle.append(worker)
+                    else:
+                        self._replace(worker)
+            if not ok:
+                raise result
+            return result
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        for worker in self._all:
+            worker.kill()
+        self._all.clear()
+        self._idle = []
+        self._slots = None
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+
+    def _ensure_started(self):
+        if self._slots is not None:
+            return
+        self._slots = asyncio.Semaphore(self.workers)
+        self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="plot")
+        self._idle = [self._spawn() for _ in range(self.workers)]
+
+    def _spawn(self):
+        worker = _Worker(self._ctx)
+        self._all.add(worker)
+        return worker
+
+    def _replace(self, worker):
+        worker.kill()
+        self._all.discard(worker)
+        try:
+            self._idle.append(self._spawn())
+        except Exception as e:  # i.e. out of fds. the next render() that gets this slot spawns one instead
+            print(f"Plot worker respawn failed: {e}")
+
+
+if __name__ == "__main__":
+    # smoke test: warm the workers, render the synthetic similarity plot, then show a timeout only costs its own job
+    import time
+
+    async def main():
+        executor = PlotExecutor(timeout=120)
+        start = time.perf_counter()
+        await executor.start()
+        print(f"warm in {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        png = await executor.render("plot_user_similarity_test")
+        is_png = png.startswith(b"\x89PNG")
+        print(f"rendered {len(png)} bytes in {time.perf_counter() - start:.2f}s, png={is_png}")
+        slow = executor.render("plot_user_similarity_test", timeout=0.01)
+        other = executor.render("plot_user_similarity_test")
+        slow, other = await asyncio.gather(slow, other, return_exceptions=True)
+        print(f"timed out job: {type(slow).__name__}, job next to it still rendered: {len(other)} bytes")
+        png = await executor.render("plot_user_similarity_test")
+        print(f"replacement worker renders: {len(png)} bytes")
+        try:
+            await executor.render("no_such_plot")
+        except AttributeError as e:
+            print(f"plot errors come back as-is: {e}")
+        executor.shutdown()
+
+    asyncio.run(main())
@@ -159,63 +159,72 @@ def plot_favorites(owner_avg_rating, owner_vantage_rating):
     plt.close(fig)
     return buf
 
-def plot_user_similarity(data, min_common=5):
+def pearson_similarity_matrix(ratings, min_common=5):
     """
-    Plot a clustered heatmap of user rating similarities.
+    Pairwise Pearson correlation between the rows (users) of a user x movie rating array, NaN = not rated.
+    Same rules as the old pair-by-pair pearsonr loop (kept as _pearson_similarity_pairwise):
+    users whose ratings are all the same get a row/column of 0s, pairs with fewer than min_common movies
+    in common or no variance over those movies get NaN, everything else gets its correlation.
     
-    Args:
-        data: List of dicts with user_id, movie_id, rating
-        min_common: Minimum number of movies in common to calculate correlation
-        
     Returns:
-        io.BytesIO with PNG plot
+        (users x users correlation array, bool array of users with at least one correlation)
     """
-    # Convert to DataFrame for easier manipulation
-    df = pd.DataFrame(data)
-    
-    # Pivot to user x movie matrix
-    ratings_matrix = df.pivot(index='user_id', columns='movie_id', values='rating')
-    
-    # Calculate correlation matrix
+    rated = ~np.isnan(ratings)
+    x = np.where(rated, ratings, 0.0)
+    # center each user on their own mean so the sums below stay small and the variance cancellation stays exact-ish
+    counts = rated.sum(axis=1)
+    means = np.divide(x.sum(axis=1), counts, out=np.zeros(len(x)), where=counts > 0)
+    x = np.where(rated, x - means[:, None], 0.0)
+    mask = rated.astype(float)
+    
+    # [i, j] entries are sums over the movies i and j both rated
+    n = mask @ mask.T
+    sum_x = x @ mask.T  # user i's ratings
+    sum_xx = (x * x) @ mask.T
+    sum_xy = x @ x.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var_x = sum_xx - sum_x * sum_x / n
+        var_y = var_x.T
+        cov = sum_xy - sum_x * sum_x.T / n
+        corr = np.clip(cov / np.sqrt(var_x * var_y), -1, 1)
+    
+    # ratings have at most a couple of decimals, so a real spread is never anywhere near this small.
+    # anything under it is float noise from a constant set of ratings
+    tolerance = 1e-9 * (sum_xx + sum_xx.T + 1)
+    users_with_variance = np.where(rated, ratings, -np.inf).max(axis=1) > np.where(rated, ratings, np.inf).min(axis=1)
+    both_vary = users_with_variance[:, None] & users_with_variance[None, :]
+    computable = (n >= min_common) & (var_x > tolerance) & (var_y > tolerance)
+    
+    corr_matrix = np.zeros_like(corr)
+    corr_matrix[both_vary] = np.nan
+    ok = both_vary & computable & ~np.isnan(corr)
+    corr_matrix[ok] = corr[ok]
+    valid_users = ok.any(axis=0) | ok.any(axis=1)
+    return corr_matrix, valid_users
+
+def _pearson_similarity_pairwise(ratings_matrix, min_common=5):
+    """the old pair-by-pair loop over a user x movie DataFrame, kept to check pearson_similarity_matrix() against"""
     n_users = len(ratings_matrix.index)
-    if n_users < 2:
-        raise ValueError("Need at least 2 users to generate similarity plot.")
-        
     corr_matrix = np.zeros((n_users, n_users))
-    user_ids = ratings_matrix.index.values
-    
-    # Track which users have enough movies in common and varying ratings
     valid_users = set()
-    
-    # First check which users have varying ratings
     users_with_variance = set()
     for i in range(n_users):
         user_ratings = ratings_matrix.iloc[i].dropna()
         if len(user_ratings.unique()) > 1:
             users_with_variance.add(i)
-    
-    if len(users_with_variance) < 2:
-        raise ValueError("Need at least 2 users with varying ratings to calculate correlations.")
-    
     for i in range(n_users):
         if i not in users_with_variance:
             continue
         user1_ratings = ratings_matrix.iloc[i]
-        
         for j in range(n_users):
             if j not in users_with_variance:
                 continue
-                
             user2_ratings = ratings_matrix.iloc[j]
             common_mask = user1_ratings.notna() & user2_ratings.notna()
             common_count = sum(common_mask)
-            
             if common_count >= min_common:
-                # Get the common ratings
                 u1_common = user1_ratings[common_mask]
                 u2_common = user2_ratings[common_mask]
-                
-                # Double check for variance in the common ratings
                 if len(u1_common.unique()) > 1 and len(u2_common.unique()) > 1:
                     try:
                         corr, _ = pearsonr(u1_common, u2_common)
@@ -229,13 +238,42 @@ def plot_user_similarity(data, min_common=5):
                     corr_matrix[i,j] = np.nan
             else:
                 corr_matrix[i,j] = np.nan
+    return corr_matrix, valid_users
+
+def plot_user_similarity(data, min_common=5):
+    """
+    Plot a clustered heatmap of user rating similarities.
+    
+    Args:
+        data: List of dicts with user_id, movie_id, rating
+        min_common: Minimum number of movies in common to calculate correlation
+        
+    Returns:
+        io.BytesIO with PNG plot
+    """
+    # Convert to DataFrame for easier manipulation
+    df = pd.DataFrame(data)
+    
+    # Pivot to user x movie matrix
+    ratings_matrix = df.pivot(index='user_id', columns='movie_id', values='rating')
+    
+    # Calculate correlation matrix
+    n_users = len(ratings_matrix.index)
+    if n_users < 2:
+        raise ValueError("Need at least 2 users to generate similarity plot.")
+        
+    if (ratings_matrix.nunique(axis=1) > 1).sum() < 2:
+        raise ValueError("Need at least 2 users with varying ratings to calculate correlations.")
+    
+    user_ids = ratings_matrix.index.values
+    corr_matrix, valid_users = pearson_similarity_matrix(ratings_matrix.to_numpy(dtype=float), min_common)
     
     # Check if we have enough valid users
-    if len(valid_users) < 2:
+    if valid_users.sum() < 2:
         raise ValueError(f"Not enough users have {min_common} or more movies in common with varying ratings. Try lowering min_common.")
         
     # Filter to only include users with enough movies in common
-    valid_indices = sorted(list(valid_users))
+    valid_indices = np.flatnonzero(valid_users)
     filtered_matrix = corr_matrix[np.ix_(valid_indices, valid_indices)]
     filtered_user_ids = user_ids[valid_indices]
     
@@ -383,4 +421,37 @@ def plot_user_similarity_test():
     print(df['rating'].describe())
     
     # Plot using the existing function
-    return plot_user_similarity(data, min_common=3)
\ No newline at end of file
+    return plot_user_similarity(data, min_common=3)
+
+def benchmark_user_similarity(n_users=500, n_movies=5000, density=0.05, min_common=5):
+    """times pearson_similarity_matrix() on a synthetic n_users x n_movies rating matrix,
+    and the old pairwise loop on a slice of it, checking they agree on that slice"""
+    import time
+    rng = np.random.default_rng(0)
+    ratings = np.round(rng.uniform(1, 10, size=(n_users, n_movies)), 1)
+    ratings[rng.random((n_users, n_movies)) > density] = np.nan
+    ratings[:5, :] = np.where(np.isnan(ratings[:5, :]), np.nan, 7.0)  # a few users who rate everything the same
+    
+    start = time.perf_counter()
+    corr_matrix, valid_users = pearson_similarity_matrix(ratings, min_common)
+    vectorized_s = time.perf_counter() - start
+    print(f"pearson_similarity_matrix: {n_users} users x {n_movies} movies in {vectorized_s:.3f}s")
+    
+    n_slice = min(60, n_users)
+    ratings_matrix = pd.DataFrame(ratings[:n_slice])
+    start = time.perf_counter()
+    old_matrix, old_valid = _pearson_similarity_pairwise(ratings_matrix, min_common)
+    pairwise_s = time.perf_counter() - start
+    pairs_ratio = (n_users / n_slice) ** 2
+    print(f"old pairwise loop: {n_slice} users in {pairwise_s:.2f}s, ~{pairwise_s * pairs_ratio:.0f}s extrapolated to {n_users} users")
+    
+    slice_matrix, slice_valid = pearson_similarity_matrix(ratings[:n_slice], min_common)
+    assert np.allclose(slice_matrix, old_matrix, equal_nan=True, atol=1e-9)
+    assert set(np.flatnonzero(slice_valid)) == old_valid
+    print("matches the old pairwise loop")
+    return corr_matrix, valid_users
+
+if __name__ == "__main__":
+    benchmark_user_similarity()
+    # sparse + low min_common hits the few-movies-in-common and no-common-variance rules a lot more
+    benchmark_user_similarity(n_users=120, n_movies=300, density=0.03, min_common=2)
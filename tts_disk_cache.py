@@ -0,0 +1,159 @@
+import os
+import mmap
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Dict
+
+TOUCH_EVERY_SECS = 60  # don't rewrite last_used on every hit of a hot clip
+
+
+def clip_key(language_code: str, voice_name: str, text: str, audio_encoding: str, speaking_rate: float) -> str:
+    """content address of a synthesized clip. anything that changes the audio has to be in here"""
+    raw = "\x1f".join([language_code, voice_name, text, audio_encoding, repr(float(speaking_rate))])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DiskTTSCache:
+    """
+    Second tier under the in-memory LRUCache so synthesized clips survive restarts.
+
+    Files are content-addressed: <dir>/<key[:2]>/<key>.audio, key = clip_key(...).
+    A SQLite index (<dir>/index.sqlite3) holds size / created / last_used per clip, which is
+    what eviction runs on: least recently used first once over max_bytes, and anything
+    older than max_age_secs regardless. Hits are read through mmap.
+
+    Blocking (sqlite + file io), so call it from a thread: asyncio.to_thread(cache.get, key)
+    """
+    def __init__(self, directory: str, max_bytes: int, max_age_secs: Optional[float] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_secs = max_age_secs
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS clips (
+                key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS clips_last_used_idx ON clips (last_used)")
+        self._db.commit()
+        self.bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM clips").fetchone()[0]
+        with self._lock:
+            self._evict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute("SELECT last_used FROM clips WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "rb") as f:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        audio = mm[:]
+            except (OSError, ValueError):
+                # file went missing or is empty; drop the index row so it gets re-synthesized
+                self._remove(key)
+                self._db.commit()
+                self.misses += 1
+                return None
+            now = time.time()
+            if now - row[0] > TOUCH_EVERY_SECS:
+                self._db.execute("UPDATE clips SET last_used=? WHERE key=?", (now, key))
+                self._db.commit()
+            self.hits += 1
+            return audio
+
+    def put(self, key: str, audio: bytes) -> None:
+        if not audio or len(audio) > self.max_bytes:
+            return
+        path = self._path(key)
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM clips WHERE key=?", (key,)).fetchone():
+                return  # content addressed, so it's already the same audio
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+            now = time.time()
+            self._db.execute(
+                "INSERT INTO clips (key, size, created, last_used) VALUES (?,?,?,?)",
+                (key, len(audio), now, now),
+            )
+            self.bytes += len(audio)
+            self._evict()
+            self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            items = self._db.execute("SELECT COUNT(*) FROM clips").fetchone()[0]
+        return {
+            "items": items,
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _evict(self) -> None:
+        if self.max_age_secs is not None:
+            cutoff = time.time() - self.max_age_secs
+            for (key,) in self._db.execute("SELECT key FROM clips WHERE last_used < ?", (cutoff,)).fetchall():
+                self._remove(key)
+        while self.bytes > self.max_bytes:
+            oldest = self._db.execute("SELECT key FROM clips ORDER BY last_used LIMIT 64").fetchall()
+            if not oldest:
+                break
+            for (key,) in oldest:
+                if self.bytes <= self.max_bytes:
+                    break
+                self._remove(key)
+        self._db.commit()
+
+    def _remove(self, key: str) -> None:
+        row = self._db.execute("SELECT size FROM clips WHERE key=?", (key,)).fetchone()
+        if row is None:
+            return
+        self._db.execute("DELETE FROM clips WHERE key=?", (key,))
+        self.bytes -= row[0]
+        self.evictions += 1
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.audio")
+
+
+if __name__ == "__main__":
+    # quick check: round trip, survives reopening, lru eviction by bytes
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        cache = DiskTTSCache(directory, max_bytes=300)
+        keys = [clip_key("en-US", "en-US-Wavenet-D", f"hello {i}", "OGG_OPUS", 1.0) for i in range(4)]
+        cache.put(keys[0], b"a" * 100)
+        cache.put(keys[1], b"b" * 100)
+        assert cache.get(keys[0]) == b"a" * 100
+        cache.close()
+
+        cache = DiskTTSCache(directory, max_bytes=300)
+        assert cache.bytes == 200 and cache.get(keys[1]) == b"b" * 100
+        cache._db.execute("UPDATE clips SET last_used = last_used - 1000 WHERE key=?", (keys[0],))
+        cache.put(keys[2], b"c" * 100)
+        cache.put(keys[3], b"d" * 100)  # over 300 bytes, keys[0] is the least recently used
+        assert cache.get(keys[0]) is None and cache.get(keys[3]) == b"d" * 100
+        print(cache.stats())
+        cache.close()